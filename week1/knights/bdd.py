@@ -0,0 +1,273 @@
+import json
+
+from logic import *
+from logic import _fold
+
+
+class BDD():
+    """
+    Reduced ordered binary decision diagrams over logical symbols.
+
+    Nodes are ints: 0 is false, 1 is true, and any other node n tests the
+    symbol at position `nodes[n][0]` of `order`, following `nodes[n][1]`
+    when it is false and `nodes[n][2]` when it is true. Nodes are shared
+    through a unique table, so two nodes are equal exactly when they
+    represent the same function.
+    """
+
+    def __init__(self, order=()):
+        self.order = []
+        self.levels = dict()
+
+        # Terminals have no level of their own
+        self.nodes = [None, None]
+
+        # Maps (level, low, high) to the node with those fields
+        self.unique = dict()
+
+        # Caches results of ite and of compiling sentences
+        self.computed = dict()
+        self.compiled = dict()
+
+        for name in order:
+            self.add_symbol(name)
+
+    def add_symbol(self, name):
+        """Adds a symbol below every symbol already in the order."""
+        if name not in self.levels:
+            self.levels[name] = len(self.order)
+            self.order.append(name)
+
+    def level(self, u):
+        """Returns the level of node u, counting terminals as the lowest."""
+        return len(self.order) if u < 2 else self.nodes[u][0]
+
+    def node(self, level, low, high):
+        """Returns the node testing `level`, reusing an existing one."""
+        if low == high:
+            return low
+        key = (level, low, high)
+        u = self.unique.get(key)
+        if u is None:
+            u = len(self.nodes)
+            self.nodes.append(key)
+            self.unique[key] = u
+        return u
+
+    def symbol(self, name):
+        """Returns the node that is true exactly when symbol `name` is."""
+        self.add_symbol(name)
+        return self.node(self.levels[name], 0, 1)
+
+    def known(self, f, g, h):
+        """
+        Returns the node for "if f then g else h" if it is a terminal case
+        or already computed, and None otherwise.
+        """
+        if f == 1:
+            return g
+        if f == 0:
+            return h
+        if g == h:
+            return g
+        if g == 1 and h == 0:
+            return f
+        return self.computed.get((f, g, h))
+
+    def ite(self, f, g, h):
+        """
+        Returns the node for "if f then g else h".
+
+        Calls still to be computed are kept on an explicit stack rather than
+        recursing, since there can be one per symbol.
+        """
+        u = self.known(f, g, h)
+        if u is not None:
+            return u
+
+        stack = [(f, g, h)]
+        while stack:
+            f, g, h = stack[-1]
+            if (f, g, h) in self.computed:
+                stack.pop()
+                continue
+
+            # Split on the topmost symbol tested by any argument
+            top = min(self.level(f), self.level(g), self.level(h))
+            f0, f1 = self.cofactors(f, top)
+            g0, g1 = self.cofactors(g, top)
+            h0, h1 = self.cofactors(h, top)
+            low = self.known(f0, g0, h0)
+            high = self.known(f1, g1, h1)
+            if low is None or high is None:
+                if high is None:
+                    stack.append((f1, g1, h1))
+                if low is None:
+                    stack.append((f0, g0, h0))
+                continue
+
+            stack.pop()
+            self.computed[(f, g, h)] = self.node(top, low, high)
+        return self.computed[(f, g, h)]
+
+    def cofactors(self, u, level):
+        """Returns the nodes for u with symbol `level` false and true."""
+        if u < 2 or self.nodes[u][0] != level:
+            return u, u
+        return self.nodes[u][1], self.nodes[u][2]
+
+    def negate(self, u):
+        return self.ite(u, 0, 1)
+
+    def build(self, sentence):
+        """
+        Compiles a logical sentence into a node, working up from its
+        symbols without recursing.
+        """
+        Sentence.validate(sentence)
+
+        def combine(sentence, parts):
+            """Returns the node for a sentence given its parts' nodes."""
+            if isinstance(sentence, Symbol):
+                u = self.symbol(sentence.name)
+            elif isinstance(sentence, Not):
+                u = self.negate(parts[0])
+            elif isinstance(sentence, And):
+                u = 1
+                for part in parts:
+                    u = self.ite(u, part, 0)
+            elif isinstance(sentence, Or):
+                u = 0
+                for part in parts:
+                    u = self.ite(u, 1, part)
+            elif isinstance(sentence, Implication):
+                u = self.ite(parts[0], parts[1], 1)
+            elif isinstance(sentence, Biconditional):
+                u = self.ite(parts[0], parts[1], self.negate(parts[1]))
+            else:
+                raise Exception(f"cannot compile {sentence}")
+
+            # Only cache sentences that can no longer change
+            if sentence._interned or not isinstance(sentence, (And, Or)):
+                self.compiled[sentence] = u
+            return u
+
+        return _fold(sentence, combine, known=self.compiled.get)
+
+    def entails(self, knowledge, query):
+        """
+        Checks if knowledge entails query.
+
+        Both may be nodes or logical sentences.
+        """
+        if isinstance(knowledge, Sentence):
+            knowledge = self.build(knowledge)
+        if isinstance(query, Sentence):
+            query = self.build(query)
+        return self.ite(knowledge, query, 1) == 1
+
+    def count(self, u):
+        """Returns the number of models of node u over every symbol."""
+
+        # Count models over the symbols from each node's level down. Nodes
+        # are created after their children, so one pass upwards suffices
+        counts = [0, 1]
+        for v in range(2, max(u, 1) + 1):
+            level, low, high = self.nodes[v]
+            counts.append(
+                (counts[low] << (self.level(low) - level - 1))
+                + (counts[high] << (self.level(high) - level - 1))
+            )
+        return counts[u] << self.level(u)
+
+    def models(self, u):
+        """Yields every model of node u, as a dict over every symbol."""
+        if u == 0:
+            return
+        if not self.order:
+            yield dict()
+            return
+
+        # Walk the paths from u, keeping for each level on the current path
+        # its node and the next branch to take, False before True
+        model = dict()
+        path = [[0, u, 0]]
+        while path:
+            frame = path[-1]
+            level, v, branch = frame
+            if branch == 2:
+                path.pop()
+                continue
+            frame[2] += 1
+            model[self.order[level]] = branch == 1
+            child = self.cofactors(v, level)[branch]
+            if child == 0:
+                continue
+            if level + 1 == len(self.order):
+                yield dict(model)
+            else:
+                path.append([level + 1, child, 0])
+
+    def to_dict(self, roots):
+        """
+        Returns a JSON-ready dict holding the nodes reachable from `roots`,
+        a dict mapping names to nodes.
+        """
+        numbers = {0: 0, 1: 1}
+        nodes = []
+
+        def number(u):
+            """Numbers u after its children, so they load first."""
+            stack = [u]
+            while stack:
+                v = stack[-1]
+                if v in numbers:
+                    stack.pop()
+                    continue
+                level, low, high = self.nodes[v]
+                pending = [w for w in (high, low) if w not in numbers]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                nodes.append([level, numbers[low], numbers[high]])
+                numbers[v] = len(nodes) + 1
+            return numbers[u]
+
+        return {
+            "order": list(self.order),
+            "nodes": nodes,
+            "roots": {name: number(u) for name, u in roots.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds a BDD from `to_dict`, returning it and its roots."""
+        bdd = cls(data["order"])
+        numbers = [0, 1]
+        for level, low, high in data["nodes"]:
+            numbers.append(bdd.node(level, numbers[low], numbers[high]))
+        roots = {name: numbers[u] for name, u in data["roots"].items()}
+        return bdd, roots
+
+    def save(self, filename, roots):
+        """Writes the nodes reachable from `roots` to a JSON file."""
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(roots), f)
+
+    @classmethod
+    def load(cls, filename):
+        """Reads a BDD saved with `save`, returning it and its roots."""
+        with open(filename) as f:
+            return cls.from_dict(json.load(f))
+
+
+def compile_knowledge(knowledge, order=None):
+    """
+    Compiles a knowledge base into a BDD.
+
+    Symbols are ordered by `order` if given, and alphabetically otherwise.
+    Returns the BDD and the node for the knowledge base.
+    """
+    bdd = BDD(sorted(knowledge.symbols()) if order is None else order)
+    return bdd, bdd.build(knowledge)
@@ -0,0 +1,202 @@
+"""
+Benchmarks for the inference backends in logic.py and bdd.py.
+
+Usage: python benchmark.py [max_people]
+       python benchmark.py --generated people [people ...]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+from bdd import compile_knowledge
+from generator import generate_puzzle
+from logic import *
+
+
+def chain_puzzle(n):
+    """
+    Builds a puzzle over `n` people, deeper than the ones in puzzle.py.
+
+    Person 0 says "I am a knave and a knight", so must be a knave, and every
+    later person says "The person before me is a knave."
+    Returns the knowledge base and the list of symbols to query.
+    """
+    knights = [Symbol(f"{i} is a Knight") for i in range(n)]
+    knaves = [Symbol(f"{i} is a Knave") for i in range(n)]
+
+    knowledge = And()
+    for knight, knave in zip(knights, knaves):
+        knowledge.add(Or(knight, knave))
+        knowledge.add(Not(And(knight, knave)))
+
+    statement = And(knaves[0], knights[0])
+    knowledge.add(Implication(knights[0], statement))
+    knowledge.add(Implication(knaves[0], Not(statement)))
+    for i in range(1, n):
+        knowledge.add(Implication(knights[i], knaves[i - 1]))
+        knowledge.add(Implication(knaves[i], Not(knaves[i - 1])))
+
+    return knowledge, knights + knaves
+
+
+def bench_pruning(max_people):
+    """Compares nodes visited and time with and without pruning."""
+    print("people  queries  nodes (full)  nodes (pruned)  time (full)  "
+          "time (pruned)")
+    for n in range(1, max_people + 1):
+        knowledge, queries = chain_puzzle(n)
+        row = []
+        for prune in (False, True):
+            stats = dict()
+            start = time.perf_counter()
+            answers = [model_check(knowledge, query, prune=prune, stats=stats)
+                       for query in queries]
+            row.append((stats["nodes"], time.perf_counter() - start, answers))
+        (full, full_time, full_answers), (pruned, pruned_time, answers) = row
+        if answers != full_answers:
+            raise Exception(f"pruned answers differ for {n} people")
+        print(f"{n:6}  {len(queries):7}  {full:12}  {pruned:14}  "
+              f"{full_time:10.3f}s  {pruned_time:12.3f}s")
+
+
+def bench_compiled(max_people):
+    """Compares interpreted and compiled evaluation, without pruning."""
+    print("people  time (interpreted)  time (compiled)")
+    for n in range(1, max_people + 1):
+        knowledge, queries = chain_puzzle(n)
+        row = []
+        for compiled in (False, True):
+            start = time.perf_counter()
+            answers = [model_check(knowledge, query, prune=False,
+                                   compiled=compiled)
+                       for query in queries]
+            row.append((time.perf_counter() - start, answers))
+        (interpreted_time, interpreted), (compiled_time, answers) = row
+        if answers != interpreted:
+            raise Exception(f"compiled answers differ for {n} people")
+        print(f"{n:6}  {interpreted_time:17.3f}s  {compiled_time:14.3f}s")
+
+
+def bench_parallel(people, max_processes):
+    """Compares the serial and parallel checkers on exhaustive checking."""
+    knowledge, queries = chain_puzzle(people)
+    start = time.perf_counter()
+    expected = [model_check(knowledge, query, prune=False)
+                for query in queries]
+    serial = time.perf_counter() - start
+    print(f"{people} people, serial: {serial:.3f}s")
+    print("processes  time  speedup")
+    processes = 1
+    while processes <= max_processes:
+        start = time.perf_counter()
+        answers = [model_check_parallel(knowledge, query, processes,
+                                        prune=False)
+                   for query in queries]
+        elapsed = time.perf_counter() - start
+        if answers != expected:
+            raise Exception(f"parallel answers differ with {processes} "
+                            "processes")
+        print(f"{processes:9}  {elapsed:.3f}s  {serial / elapsed:.2f}x")
+        processes *= 2
+
+
+def entailed_model_check(knowledge, queries):
+    return [query for query in queries if model_check(knowledge, query)]
+
+
+def entailed_parallel(knowledge, queries):
+    return [query for query in queries
+            if model_check_parallel(knowledge, query)]
+
+
+def entailed_bdd(knowledge, queries):
+    bdd, node = compile_knowledge(knowledge)
+    return [query for query in queries if bdd.entails(node, query)]
+
+
+def entailed_resolution(knowledge, queries):
+    return [query for query in queries
+            if resolution_check(knowledge, query)]
+
+
+# Each backend returns the queries a knowledge base entails
+BACKENDS = {
+    "model_check": entailed_model_check,
+    "model_check_all": model_check_all,
+    "parallel": entailed_parallel,
+    "bdd": entailed_bdd,
+    "resolution": entailed_resolution
+}
+
+
+def bench_backends(sizes, backends=BACKENDS, seed=0, limit=60):
+    """
+    Compares backends on generated puzzles of each size, for time, peak
+    memory and correctness against the known solution.
+
+    Memory is measured in a second, traced run, since tracing slows some
+    backends down many times over; it is skipped when the first run took
+    over a fiftieth of `limit` seconds. A backend is skipped on larger
+    puzzles once it takes over `limit` seconds, or fails with a
+    RecursionError or MemoryError.
+    """
+
+    def run(backend, knowledge, queries):
+        """Runs a backend on a fresh copy, so no caches are shared."""
+        knowledge = intern(And(*knowledge.conjuncts))
+        start = time.perf_counter()
+        answers = backend(knowledge, queries)
+        return answers, time.perf_counter() - start
+
+    print("people  backend          time       peak memory  correct")
+    slow = set()
+    for people in sizes:
+        knowledge, queries, solution = generate_puzzle(people, seed)
+        expected = [query for query in queries if solution[query]]
+        for name, backend in backends.items():
+            if name in slow:
+                continue
+
+            # A backend that runs out of stack or memory fails this size
+            # and is not tried on larger ones
+            try:
+                answers, elapsed = run(backend, knowledge, queries)
+                memory = "-"
+                if elapsed <= limit / 50:
+                    tracemalloc.start()
+                    try:
+                        run(backend, knowledge, queries)
+                        _, peak = tracemalloc.get_traced_memory()
+                    finally:
+                        tracemalloc.stop()
+                    memory = f"{peak / 1024 / 1024:.1f}MB"
+            except (RecursionError, MemoryError) as error:
+                print(f"{people:6}  {name:15}  {'-':>9}  {'-':>11}  "
+                      f"failed: {type(error).__name__}")
+                slow.add(name)
+                continue
+
+            correct = "yes" if answers == expected else "NO"
+            print(f"{people:6}  {name:15}  {elapsed:8.3f}s  "
+                  f"{memory:>11}  {correct}")
+            if elapsed > limit:
+                slow.add(name)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--generated":
+        sizes = [int(size) for size in sys.argv[2:]] or [5, 10, 20]
+        bench_backends(sizes)
+        return
+
+    max_people = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    bench_pruning(max_people)
+    print()
+    bench_compiled(max_people)
+    print()
+    bench_parallel(max_people + 2, os.cpu_count() or 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Random knights and knaves puzzles with known solutions.
+
+Usage: python generator.py people [seed]
+"""
+import random
+import sys
+
+from logic import *
+
+
+def generate_puzzle(people, seed=None, extra=0):
+    """
+    Builds a random knights and knaves puzzle over `people` people.
+
+    Person 0 makes a statement that only a knight (or only a knave) could
+    make, and every later person makes a random statement about people
+    before them, so the puzzle has exactly one solution. `extra` more
+    statements, true to the solution, are added by random people.
+
+    Returns the knowledge base, the list of symbols to query, and the
+    solution as a dict mapping each of those symbols to whether it holds.
+    """
+    rng = random.Random(seed)
+    width = len(str(people - 1))
+    names = [f"P{i:0{width}}" for i in range(people)]
+    knights = [Symbol(f"{name} is a Knight") for name in names]
+    knaves = [Symbol(f"{name} is a Knave") for name in names]
+    is_knight = [rng.random() < 0.5 for _ in range(people)]
+
+    knowledge = And()
+    for knight, knave in zip(knights, knaves):
+        knowledge.add(Or(knight, knave))
+        knowledge.add(Not(And(knight, knave)))
+
+    def says(i, statement):
+        """Adds that person i says `statement`."""
+        knowledge.add(Implication(knights[i], statement))
+        knowledge.add(Implication(knaves[i], Not(statement)))
+
+    def statement(i, about):
+        """Returns a random statement by person i about people in `about`,
+        true exactly when person i is a knight."""
+        j = rng.choice(about)
+        k = rng.choice(about)
+        kind = rng.randrange(4)
+        if kind == 0:
+            # "j is a knight."
+            sentence, holds = knights[j], is_knight[j]
+        elif kind == 1:
+            # "j is a knave."
+            sentence, holds = knaves[j], not is_knight[j]
+        elif kind == 2:
+            # "j and k are the same kind."
+            sentence = Or(And(knights[j], knights[k]),
+                          And(knaves[j], knaves[k]))
+            holds = is_knight[j] == is_knight[k]
+        else:
+            # "If j is a knight, then k is a knave."
+            sentence = Implication(knights[j], knaves[k])
+            holds = not is_knight[j] or not is_knight[k]
+        if holds != is_knight[i]:
+            sentence, holds = Not(sentence), not holds
+        return sentence
+
+    # "I am a knight or a knave." can only be said by a knight, and
+    # "I am a knight and a knave." only by a knave
+    if is_knight[0]:
+        says(0, Or(knights[0], knaves[0]))
+    else:
+        says(0, And(knights[0], knaves[0]))
+
+    for i in range(1, people):
+        says(i, statement(i, range(i)))
+
+    for _ in range(extra):
+        i = rng.randrange(people)
+        says(i, statement(i, range(people)))
+
+    solution = dict()
+    for i in range(people):
+        solution[knights[i]] = is_knight[i]
+        solution[knaves[i]] = not is_knight[i]
+    return knowledge, knights + knaves, solution
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python generator.py people [seed]")
+    people = int(sys.argv[1])
+    seed = int(sys.argv[2]) if len(sys.argv) == 3 else None
+    knowledge, queries, solution = generate_puzzle(people, seed)
+    for conjunct in knowledge.conjuncts[2 * people:]:
+        print(conjunct.formula())
+    print()
+    for query in queries:
+        if solution[query]:
+            print(f"    {query}")
+
+
+if __name__ == "__main__":
+    main()
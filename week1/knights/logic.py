@@ -1,19 +1,161 @@
+import heapq
 import itertools
+import multiprocessing
+import os
+import re
+import types
+import weakref
 
 
 class Sentence():
+    """
+    Logical sentence.
+
+    Hashes and symbol sets are computed once and cached, so a sentence
+    should not be changed after it has been used as a dictionary key or
+    placed inside another sentence.
+    """
+
+    __slots__ = ("_hash", "_symbols", "_interned", "_deep", "__weakref__")
+
+    def __init__(self):
+        self._hash = None
+        self._symbols = None
+        self._interned = False
+        self._deep = False
+
+    def __eq__(self, other):
+        pairs = [(self, other)]
+        while pairs:
+            a, b = pairs.pop()
+            if a is b:
+                continue
+            if type(a) is not type(b) or hash(a) != hash(b):
+                return False
+            if isinstance(a, Symbol):
+                if a.name != b.name:
+                    return False
+                continue
+            a_parts, b_parts = _parts(a), _parts(b)
+            if len(a_parts) != len(b_parts):
+                return False
+            pairs.extend(zip(a_parts, b_parts))
+        return True
+
+    def __hash__(self):
+        if self._hash is None:
+
+            def combine(sentence, parts):
+                if isinstance(sentence, Symbol):
+                    sentence._hash = hash(("symbol", sentence.name))
+                elif isinstance(sentence, (And, Or)):
+                    sentence._hash = hash((sentence.tag, tuple(parts)))
+                else:
+                    sentence._hash = hash((sentence.tag, *parts))
+                return sentence._hash
+
+            _fold(self, combine, lambda sentence: sentence._hash)
+        return self._hash
+
+    def __reduce__(self):
+        # Pickle the parts as a flat list, since pickling them in turn
+        # would recurse once per level of the sentence
+        return (_unflatten, (_flatten(self),))
 
     def evaluate(self, model):
         """Evaluates the logical sentence."""
-        raise Exception("nothing to evaluate")
+        if not self._deep:
+            try:
+                return self._evaluate_recursive(model)
+            except RecursionError:
+                self._deep = True
+        return _run(self, "_evaluate_steps", model)
+
+    def evaluate_partial(self, model):
+        """
+        Evaluates the logical sentence under a partial model.
+
+        Returns True or False if the symbols assigned so far decide the
+        sentence, or None if its value still depends on unassigned symbols.
+        """
+        if not self._deep:
+            try:
+                return self._partial_recursive(model)
+            except RecursionError:
+                self._deep = True
+        return _run(self, "_partial_steps", model)
 
     def formula(self):
         """Returns string formula representing logical sentence."""
-        return ""
+        if not self._deep:
+            try:
+                return self._formula_recursive()
+            except RecursionError:
+                self._deep = True
+        return _run(self, "_formula_steps")
+
+    def expression(self, bits):
+        """
+        Returns a Python expression evaluating the sentence in a full model.
+
+        The model is an int `v`, with the bit `bits[name]` set when that
+        symbol is true.
+        """
+        raise Exception("nothing to evaluate")
+
+    def partial_expression(self, bits, value):
+        """
+        Returns a Python expression that is true when the sentence is
+        decided to be `value` under a partial model.
+
+        The partial model is a pair of ints `t` and `f`, with the bit
+        `bits[name]` set in `t` when that symbol is true and in `f` when it
+        is false.
+        """
+        raise Exception("nothing to evaluate")
 
     def symbols(self):
-        """Returns a set of all symbols in the logical sentence."""
-        return set()
+        """
+        Returns a set of all symbols in the logical sentence.
+
+        The set is a copy of a frozenset cached on the sentence, so callers
+        can change it freely.
+        """
+        if not self._deep:
+            try:
+                return set(self._symbol_recursive())
+            except RecursionError:
+                self._deep = True
+        return set(_run(self, "_symbol_steps"))
+
+    # Each method above recurses over the parts of the sentence, which is
+    # quickest, until that raises a RecursionError. From then on the
+    # sentence is marked as deep and runs the matching step method on an
+    # explicit stack instead (see _run)
+
+    def _evaluate_recursive(self, model):
+        raise Exception("nothing to evaluate")
+
+    def _partial_recursive(self, model):
+        raise Exception("nothing to evaluate")
+
+    def _formula_recursive(self):
+        return ""
+
+    def _symbol_recursive(self):
+        return frozenset()
+
+    def _evaluate_steps(self, model):
+        raise Exception("nothing to evaluate")
+
+    def _partial_steps(self, model):
+        raise Exception("nothing to evaluate")
+
+    def _formula_steps(self):
+        return ""
+
+    def _symbol_steps(self):
+        return frozenset()
 
     @classmethod
     def validate(cls, sentence):
@@ -42,71 +184,137 @@ class Sentence():
             return f"({s})"
 
 
+def _run(sentence, method, *args):
+    """
+    Runs a step method over a sentence and its parts, using an explicit
+    stack instead of recursion.
+
+    A step method either returns its result directly, or is a generator
+    that yields each part whose result it needs, is sent that result, and
+    returns its own.
+    """
+    result = getattr(sentence, method)(*args)
+    if not isinstance(result, types.GeneratorType):
+        return result
+    stack = [result]
+    result = None
+    while stack:
+        try:
+            part = stack[-1].send(result)
+        except StopIteration as stop:
+            stack.pop()
+            result = stop.value
+            continue
+        result = getattr(part, method)(*args)
+        if isinstance(result, types.GeneratorType):
+            stack.append(result)
+            result = None
+    return result
+
+
 class Symbol(Sentence):
+    __slots__ = ("name",)
 
     def __init__(self, name):
+        super().__init__()
         self.name = name
 
-    def __eq__(self, other):
-        return isinstance(other, Symbol) and self.name == other.name
-
-    def __hash__(self):
-        return hash(("symbol", self.name))
+    def __reduce__(self):
+        return (Symbol, (self.name,))
 
     def __repr__(self):
         return self.name
 
-    def evaluate(self, model):
+    def _evaluate_steps(self, model):
         try:
             return bool(model[self.name])
         except KeyError:
             raise Exception(f"variable {self.name} not in model")
 
-    def formula(self):
+    def _partial_steps(self, model):
+        value = model.get(self.name)
+        return None if value is None else bool(value)
+
+    def _formula_steps(self):
         return self.name
 
-    def symbols(self):
-        return {self.name}
+    def expression(self, bits):
+        return f"(v & {bits[self.name]} != 0)"
+
+    def partial_expression(self, bits, value):
+        return f"({'t' if value else 'f'} & {bits[self.name]} != 0)"
+
+    def _symbol_steps(self):
+        if self._symbols is None:
+            self._symbols = frozenset((self.name,))
+        return self._symbols
+
+    # A symbol has no parts, so its steps already return directly
+    _evaluate_recursive = _evaluate_steps
+    _partial_recursive = _partial_steps
+    _formula_recursive = _formula_steps
+    _symbol_recursive = _symbol_steps
 
 
 class Not(Sentence):
+    __slots__ = ("operand",)
+    tag = "not"
+
     def __init__(self, operand):
+        super().__init__()
         Sentence.validate(operand)
         self.operand = operand
 
-    def __eq__(self, other):
-        return isinstance(other, Not) and self.operand == other.operand
-
-    def __hash__(self):
-        return hash(("not", hash(self.operand)))
-
     def __repr__(self):
         return f"Not({self.operand})"
 
-    def evaluate(self, model):
-        return not self.operand.evaluate(model)
+    def _evaluate_recursive(self, model):
+        return not self.operand._evaluate_recursive(model)
 
-    def formula(self):
-        return "¬" + Sentence.parenthesize(self.operand.formula())
+    def _partial_recursive(self, model):
+        value = self.operand._partial_recursive(model)
+        return None if value is None else not value
 
-    def symbols(self):
-        return self.operand.symbols()
+    def _formula_recursive(self):
+        return "¬" + Sentence.parenthesize(self.operand._formula_recursive())
+
+    def _symbol_recursive(self):
+        if self._symbols is None:
+            self._symbols = self.operand._symbol_recursive()
+        return self._symbols
+
+    def _evaluate_steps(self, model):
+        return not (yield self.operand)
+
+    def _partial_steps(self, model):
+        value = yield self.operand
+        return None if value is None else not value
+
+    def _formula_steps(self):
+        return "¬" + Sentence.parenthesize((yield self.operand))
+
+    def expression(self, bits):
+        return f"(not {self.operand.expression(bits)})"
+
+    def partial_expression(self, bits, value):
+        return self.operand.partial_expression(bits, not value)
+
+    def _symbol_steps(self):
+        if self._symbols is None:
+            self._symbols = yield self.operand
+        return self._symbols
 
 
 class And(Sentence):
+    __slots__ = ("conjuncts",)
+    tag = "and"
+
     def __init__(self, *conjuncts):
+        super().__init__()
         for conjunct in conjuncts:
             Sentence.validate(conjunct)
         self.conjuncts = list(conjuncts)
 
-    def __eq__(self, other):
-        return isinstance(other, And) and self.conjuncts == other.conjuncts
-
-    def __hash__(self):
-        return hash(
-            ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
-        )
-
     def __repr__(self):
         conjunctions = ", ".join(
             [str(conjunct) for conjunct in self.conjuncts]
@@ -115,149 +323,1159 @@ class And(Sentence):
 
     def add(self, conjunct):
         Sentence.validate(conjunct)
+        if self._interned:
+            raise TypeError("cannot add to an interned sentence")
         self.conjuncts.append(conjunct)
-
-    def evaluate(self, model):
-        return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
-
-    def formula(self):
+        self._hash = None
+        self._symbols = None
+
+    def _evaluate_recursive(self, model):
+        for conjunct in self.conjuncts:
+            if not conjunct._evaluate_recursive(model):
+                return False
+        return True
+
+    def _partial_recursive(self, model):
+        result = True
+        for conjunct in self.conjuncts:
+            value = conjunct._partial_recursive(model)
+            if value is False:
+                return False
+            if value is None:
+                result = None
+        return result
+
+    def _formula_recursive(self):
         if len(self.conjuncts) == 1:
-            return self.conjuncts[0].formula()
-        return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
-                           for conjunct in self.conjuncts])
-
-    def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+            return self.conjuncts[0]._formula_recursive()
+        return " ∧ ".join([
+            Sentence.parenthesize(conjunct._formula_recursive())
+            for conjunct in self.conjuncts
+        ])
+
+    def _symbol_recursive(self):
+        if self._symbols is None:
+            self._symbols = frozenset().union(
+                *[conjunct._symbol_recursive() for conjunct in self.conjuncts]
+            )
+        return self._symbols
+
+    def _evaluate_steps(self, model):
+        for conjunct in self.conjuncts:
+            if not (yield conjunct):
+                return False
+        return True
+
+    def _partial_steps(self, model):
+        result = True
+        for conjunct in self.conjuncts:
+            value = yield conjunct
+            if value is False:
+                return False
+            if value is None:
+                result = None
+        return result
+
+    def _formula_steps(self):
+        formulas = []
+        for conjunct in self.conjuncts:
+            formulas.append((yield conjunct))
+        if len(formulas) == 1:
+            return formulas[0]
+        return " ∧ ".join([Sentence.parenthesize(formula)
+                           for formula in formulas])
+
+    def expression(self, bits):
+        if not self.conjuncts:
+            return "True"
+        return "(" + " and ".join(
+            [conjunct.expression(bits) for conjunct in self.conjuncts]
+        ) + ")"
+
+    def partial_expression(self, bits, value):
+        if not self.conjuncts:
+            return "True" if value else "False"
+        operator = " and " if value else " or "
+        return "(" + operator.join(
+            [conjunct.partial_expression(bits, value)
+             for conjunct in self.conjuncts]
+        ) + ")"
+
+    def _symbol_steps(self):
+        if self._symbols is None:
+            symbols = []
+            for conjunct in self.conjuncts:
+                symbols.append((yield conjunct))
+            self._symbols = frozenset().union(*symbols)
+        return self._symbols
 
 
 class Or(Sentence):
+    __slots__ = ("disjuncts",)
+    tag = "or"
+
     def __init__(self, *disjuncts):
+        super().__init__()
         for disjunct in disjuncts:
             Sentence.validate(disjunct)
         self.disjuncts = list(disjuncts)
 
-    def __eq__(self, other):
-        return isinstance(other, Or) and self.disjuncts == other.disjuncts
-
-    def __hash__(self):
-        return hash(
-            ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
-        )
-
     def __repr__(self):
         disjuncts = ", ".join([str(disjunct) for disjunct in self.disjuncts])
         return f"Or({disjuncts})"
 
-    def evaluate(self, model):
-        return any(disjunct.evaluate(model) for disjunct in self.disjuncts)
-
-    def formula(self):
+    def _evaluate_recursive(self, model):
+        for disjunct in self.disjuncts:
+            if disjunct._evaluate_recursive(model):
+                return True
+        return False
+
+    def _partial_recursive(self, model):
+        result = False
+        for disjunct in self.disjuncts:
+            value = disjunct._partial_recursive(model)
+            if value is True:
+                return True
+            if value is None:
+                result = None
+        return result
+
+    def _formula_recursive(self):
         if len(self.disjuncts) == 1:
-            return self.disjuncts[0].formula()
-        return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
-                            for disjunct in self.disjuncts])
-
-    def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+            return self.disjuncts[0]._formula_recursive()
+        return " ∨  ".join([
+            Sentence.parenthesize(disjunct._formula_recursive())
+            for disjunct in self.disjuncts
+        ])
+
+    def _symbol_recursive(self):
+        if self._symbols is None:
+            self._symbols = frozenset().union(
+                *[disjunct._symbol_recursive() for disjunct in self.disjuncts]
+            )
+        return self._symbols
+
+    def _evaluate_steps(self, model):
+        for disjunct in self.disjuncts:
+            if (yield disjunct):
+                return True
+        return False
+
+    def _partial_steps(self, model):
+        result = False
+        for disjunct in self.disjuncts:
+            value = yield disjunct
+            if value is True:
+                return True
+            if value is None:
+                result = None
+        return result
+
+    def _formula_steps(self):
+        formulas = []
+        for disjunct in self.disjuncts:
+            formulas.append((yield disjunct))
+        if len(formulas) == 1:
+            return formulas[0]
+        return " ∨  ".join([Sentence.parenthesize(formula)
+                            for formula in formulas])
+
+    def expression(self, bits):
+        if not self.disjuncts:
+            return "False"
+        return "(" + " or ".join(
+            [disjunct.expression(bits) for disjunct in self.disjuncts]
+        ) + ")"
+
+    def partial_expression(self, bits, value):
+        if not self.disjuncts:
+            return "False" if value else "True"
+        operator = " or " if value else " and "
+        return "(" + operator.join(
+            [disjunct.partial_expression(bits, value)
+             for disjunct in self.disjuncts]
+        ) + ")"
+
+    def _symbol_steps(self):
+        if self._symbols is None:
+            symbols = []
+            for disjunct in self.disjuncts:
+                symbols.append((yield disjunct))
+            self._symbols = frozenset().union(*symbols)
+        return self._symbols
 
 
 class Implication(Sentence):
+    __slots__ = ("antecedent", "consequent")
+    tag = "implies"
+
     def __init__(self, antecedent, consequent):
+        super().__init__()
         Sentence.validate(antecedent)
         Sentence.validate(consequent)
         self.antecedent = antecedent
         self.consequent = consequent
 
-    def __eq__(self, other):
-        return (isinstance(other, Implication)
-                and self.antecedent == other.antecedent
-                and self.consequent == other.consequent)
-
-    def __hash__(self):
-        return hash(("implies", hash(self.antecedent), hash(self.consequent)))
-
     def __repr__(self):
         return f"Implication({self.antecedent}, {self.consequent})"
 
-    def evaluate(self, model):
-        return ((not self.antecedent.evaluate(model))
-                or self.consequent.evaluate(model))
+    def _evaluate_recursive(self, model):
+        return ((not self.antecedent._evaluate_recursive(model))
+                or self.consequent._evaluate_recursive(model))
 
-    def formula(self):
-        antecedent = Sentence.parenthesize(self.antecedent.formula())
-        consequent = Sentence.parenthesize(self.consequent.formula())
+    def _partial_recursive(self, model):
+        antecedent = self.antecedent._partial_recursive(model)
+        if antecedent is False:
+            return True
+        consequent = self.consequent._partial_recursive(model)
+        if consequent is True:
+            return True
+        if antecedent is True and consequent is False:
+            return False
+        return None
+
+    def _formula_recursive(self):
+        antecedent = self.antecedent._formula_recursive()
+        consequent = self.consequent._formula_recursive()
+        return (f"{Sentence.parenthesize(antecedent)} => "
+                f"{Sentence.parenthesize(consequent)}")
+
+    def _symbol_recursive(self):
+        if self._symbols is None:
+            self._symbols = (self.antecedent._symbol_recursive()
+                             | self.consequent._symbol_recursive())
+        return self._symbols
+
+    def _evaluate_steps(self, model):
+        return (not (yield self.antecedent)) or (yield self.consequent)
+
+    def _partial_steps(self, model):
+        antecedent = yield self.antecedent
+        if antecedent is False:
+            return True
+        consequent = yield self.consequent
+        if consequent is True:
+            return True
+        if antecedent is True and consequent is False:
+            return False
+        return None
+
+    def _formula_steps(self):
+        antecedent = Sentence.parenthesize((yield self.antecedent))
+        consequent = Sentence.parenthesize((yield self.consequent))
         return f"{antecedent} => {consequent}"
 
-    def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
+    def expression(self, bits):
+        antecedent = self.antecedent.expression(bits)
+        consequent = self.consequent.expression(bits)
+        return f"(not {antecedent} or {consequent})"
+
+    def partial_expression(self, bits, value):
+        if value:
+            antecedent = self.antecedent.partial_expression(bits, False)
+            consequent = self.consequent.partial_expression(bits, True)
+            return f"({antecedent} or {consequent})"
+        antecedent = self.antecedent.partial_expression(bits, True)
+        consequent = self.consequent.partial_expression(bits, False)
+        return f"({antecedent} and {consequent})"
+
+    def _symbol_steps(self):
+        if self._symbols is None:
+            antecedent = yield self.antecedent
+            consequent = yield self.consequent
+            self._symbols = antecedent | consequent
+        return self._symbols
 
 
 class Biconditional(Sentence):
+    __slots__ = ("left", "right")
+    tag = "biconditional"
+
     def __init__(self, left, right):
+        super().__init__()
         Sentence.validate(left)
         Sentence.validate(right)
         self.left = left
         self.right = right
 
-    def __eq__(self, other):
-        return (isinstance(other, Biconditional)
-                and self.left == other.left
-                and self.right == other.right)
-
-    def __hash__(self):
-        return hash(("biconditional", hash(self.left), hash(self.right)))
-
     def __repr__(self):
         return f"Biconditional({self.left}, {self.right})"
 
-    def evaluate(self, model):
-        return ((self.left.evaluate(model)
-                 and self.right.evaluate(model))
-                or (not self.left.evaluate(model)
-                    and not self.right.evaluate(model)))
+    def _evaluate_recursive(self, model):
+        return (self.left._evaluate_recursive(model)
+                == self.right._evaluate_recursive(model))
+
+    def _partial_recursive(self, model):
+        left = self.left._partial_recursive(model)
+        if left is None:
+            return None
+        right = self.right._partial_recursive(model)
+        if right is None:
+            return None
+        return left == right
+
+    def _formula_recursive(self):
+        left = Sentence.parenthesize(self.left._formula_recursive())
+        right = Sentence.parenthesize(self.right._formula_recursive())
+        return f"{left} <=> {right}"
 
-    def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
+    def _symbol_recursive(self):
+        if self._symbols is None:
+            self._symbols = (self.left._symbol_recursive()
+                             | self.right._symbol_recursive())
+        return self._symbols
+
+    def _evaluate_steps(self, model):
+        left = yield self.left
+        right = yield self.right
+        return left == right
+
+    def _partial_steps(self, model):
+        left = yield self.left
+        if left is None:
+            return None
+        right = yield self.right
+        if right is None:
+            return None
+        return left == right
+
+    def _formula_steps(self):
+        left = Sentence.parenthesize((yield self.left))
+        right = Sentence.parenthesize((yield self.right))
         return f"{left} <=> {right}"
 
-    def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
+    def expression(self, bits):
+        left = self.left.expression(bits)
+        right = self.right.expression(bits)
+        return f"({left} == {right})"
+
+    def partial_expression(self, bits, value):
+        left_true = self.left.partial_expression(bits, True)
+        left_false = self.left.partial_expression(bits, False)
+        right_true = self.right.partial_expression(bits, value)
+        right_false = self.right.partial_expression(bits, not value)
+        return (f"(({left_true} and {right_true}) or "
+                f"({left_false} and {right_false}))")
+
+    def _symbol_steps(self):
+        if self._symbols is None:
+            left = yield self.left
+            right = yield self.right
+            self._symbols = left | right
+        return self._symbols
+
+
+def _parts(sentence):
+    """Returns the sentences a sentence is built from."""
+    if isinstance(sentence, Symbol):
+        return ()
+    elif isinstance(sentence, Not):
+        return (sentence.operand,)
+    elif isinstance(sentence, And):
+        return tuple(sentence.conjuncts)
+    elif isinstance(sentence, Or):
+        return tuple(sentence.disjuncts)
+    elif isinstance(sentence, Implication):
+        return (sentence.antecedent, sentence.consequent)
+    elif isinstance(sentence, Biconditional):
+        return (sentence.left, sentence.right)
+    raise TypeError("must be a logical sentence")
+
+
+def _fold(sentence, combine, known=None):
+    """
+    Combines the results for the parts of a sentence bottom-up, using an
+    explicit stack instead of recursion.
+
+    `combine(node, results)` is called once for each distinct node, with
+    the results for its parts, and the result for `sentence` is returned.
+    If `known(node)` is given and not None, it is used as the result for
+    that node without visiting its parts.
+    """
+    results = dict()
+    stack = [sentence]
+    while stack:
+        node = stack[-1]
+        if id(node) in results:
+            stack.pop()
+            continue
+        if known is not None:
+            result = known(node)
+            if result is not None:
+                results[id(node)] = result
+                stack.pop()
+                continue
+        parts = _parts(node)
+        pending = [part for part in parts if id(part) not in results]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        results[id(node)] = combine(
+            node, [results[id(part)] for part in parts]
+        )
+    return results[id(sentence)]
 
 
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+def _flatten(sentence):
+    """
+    Returns a sentence as a list of its distinct nodes, parts first. Each
+    node is its class and either its symbol name or the positions of its
+    parts in the list.
+    """
+    nodes = []
 
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
+    def combine(sentence, parts):
+        if isinstance(sentence, Symbol):
+            nodes.append((Symbol, sentence.name))
+        else:
+            nodes.append((type(sentence), tuple(parts)))
+        return len(nodes) - 1
 
-        # If model has an assignment for each symbol
-        if not symbols:
+    _fold(sentence, combine)
+    return nodes
 
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
+
+def _unflatten(nodes):
+    """Rebuilds a sentence from the list of nodes _flatten returns."""
+    built = []
+    for cls, args in nodes:
+        if cls is Symbol:
+            built.append(Symbol(args))
         else:
+            built.append(cls(*[built[k] for k in args]))
+    return built[-1]
+
+
+# Interned sentences, keyed by their type and the ids of their interned parts
+_shared = weakref.WeakValueDictionary()
+
+
+def intern(sentence):
+    """
+    Returns the shared copy of a sentence.
+
+    Structurally identical sentences are interned to the same object, so
+    repeated subtrees are stored once and compare by identity. Interned
+    sentences cannot be added to.
+    """
+
+    def share(node, parts):
+        """Returns the shared copy of a node, given its shared parts."""
+        if node._interned:
+            return node
+        if isinstance(node, Symbol):
+            key = (Symbol, node.name)
+        else:
+            key = (type(node), tuple(id(part) for part in parts))
+        shared = _shared.get(key)
+        if shared is None:
+            if isinstance(node, Symbol):
+                shared = Symbol(node.name)
+            else:
+                shared = type(node)(*parts)
+            shared._interned = True
+            _shared[key] = shared
+        return shared
+
+    return _fold(sentence, share)
+
+
+class _BitModel():
+    """
+    Model read from bitmasks of the symbols assigned true and false.
+    """
+
+    def __init__(self, bits, t, f):
+        self.bits = bits
+        self.t = t
+        self.f = f
+
+    def __getitem__(self, name):
+        bit = self.bits[name]
+        if self.t & bit:
+            return True
+        if self.f & bit:
+            return False
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+
+class CompiledSentence():
+    """
+    Logical sentence compiled into Python functions over bitmask models.
+
+    Symbol `order[i]` is bit i of a model. `evaluate(v)` evaluates the
+    sentence in a full model `v`. `is_true(t, f)` and `is_false(t, f)`
+    check whether the sentence is decided under a partial model, where `t`
+    and `f` hold the bits of the symbols assigned true and false so far.
+
+    Sentences too deep or too large for Python source are evaluated by
+    walking the sentence instead.
+    """
+
+    max_depth = 50
+    max_size = 100000
+
+    def __init__(self, sentence, order):
+        self.sentence = sentence
+        self.order = tuple(order)
+        bits = {name: 1 << i for i, name in enumerate(self.order)}
+
+        depth, size = _fold(sentence, CompiledSentence.source_size)
+        if depth > CompiledSentence.max_depth or (
+            size > CompiledSentence.max_size
+        ):
+            self.evaluate = lambda v: sentence.evaluate(
+                _BitModel(bits, v, ~v)
+            )
+            self.is_true = lambda t, f: sentence.evaluate_partial(
+                _BitModel(bits, t, f)
+            ) is True
+            self.is_false = lambda t, f: sentence.evaluate_partial(
+                _BitModel(bits, t, f)
+            ) is False
+            return
+
+        self.evaluate = eval(
+            f"lambda v: bool({sentence.expression(bits)})"
+        )
+        self.is_true = eval(
+            f"lambda t, f: bool({sentence.partial_expression(bits, True)})"
+        )
+        self.is_false = eval(
+            f"lambda t, f: bool({sentence.partial_expression(bits, False)})"
+        )
+
+    def __repr__(self):
+        return f"CompiledSentence({self.sentence})"
+
+    @staticmethod
+    def source_size(sentence, parts):
+        """
+        Returns the nesting depth and the number of terms of the partial
+        expressions for a sentence, given those of its parts.
+        """
+        depth = 1 + max([part[0] for part in parts], default=0)
+        size = 1 + sum([part[1] for part in parts])
+
+        # Biconditionals test each part for both values
+        if isinstance(sentence, Biconditional):
+            size *= 2
+        return depth, size
+
+
+def model_check(knowledge, query, prune=True, stats=None, compiled=True):
+    """
+    Checks if knowledge base entails query.
+
+    With `prune`, the partial model is evaluated before each branch, and
+    the search stops as soon as the knowledge base is false or the query is
+    true for every way of completing it. If a `stats` dict is given, the
+    number of models visited is counted in stats["nodes"]. Unless
+    `compiled` is False, both sentences are first compiled into functions
+    over bitmask models.
+    """
+
+    def check_all(knowledge, query, symbols):
+        """Checks if knowledge base entails query in every model."""
+
+        # Each model still to check, with the symbols it leaves unassigned
+        stack = [(dict(), symbols)]
+        while stack:
+            model, symbols = stack.pop()
+            if stats is not None:
+                stats["nodes"] = stats.get("nodes", 0) + 1
+
+            # If model has an assignment for each symbol
+            if not symbols:
+
+                # If knowledge base is true in model, then query must also
+                # be true
+                if knowledge.evaluate(model) and not query.evaluate(model):
+                    return False
+                continue
+            elif prune:
+
+                # Entailment holds if no completion of the model satisfies
+                # the knowledge base, or if every completion satisfies the
+                # query
+                kb = knowledge.evaluate_partial(model)
+                if kb is False:
+                    continue
+                value = query.evaluate_partial(model)
+                if value is True:
+                    continue
+
+                # Any completion is then a counter-model
+                if kb is True and value is False:
+                    return False
 
             # Choose one of the remaining unused symbols
             remaining = symbols.copy()
             p = remaining.pop()
 
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
-
-            # Create a model where the symbol is false
+            # Check the model where the symbol is true first
             model_false = model.copy()
             model_false[p] = False
+            stack.append((model_false, remaining))
+            model_true = model.copy()
+            model_true[p] = True
+            stack.append((model_true, remaining))
 
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
+        return True
 
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
+    symbols = sorted(knowledge.symbols() | query.symbols())
 
     # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+    if not compiled:
+        return check_all(knowledge, query, set(symbols))
+    kb = CompiledSentence(knowledge, symbols)
+    q = CompiledSentence(query, symbols)
+    return check_compiled(kb, q, 0, 0, 0, prune, stats)
+
+
+def check_compiled(kb, q, i, t, f, prune=True, stats=None):
+    """
+    Checks if compiled knowledge base `kb` entails compiled query `q`
+    in every completion of a partial model.
+
+    Symbols before position i are assigned, true in bitmask `t` and false
+    in bitmask `f`, and the rest are free.
+    """
+    n = len(kb.order)
+    stack = [(i, t, f)]
+    while stack:
+        i, t, f = stack.pop()
+        if stats is not None:
+            stats["nodes"] = stats.get("nodes", 0) + 1
+
+        # If model has an assignment for each symbol
+        if i == n:
+            if kb.evaluate(t) and not q.evaluate(t):
+                return False
+            continue
+        elif prune:
+            if kb.is_false(t, f) or q.is_true(t, f):
+                continue
+            if kb.is_true(t, f) and q.is_false(t, f):
+                return False
+
+        # Assign symbol i true, then false
+        bit = 1 << i
+        stack.append((i + 1, t, f | bit))
+        stack.append((i + 1, t | bit, f))
+
+    return True
+
+
+# Compiled sentences for the partitions checked by a worker process
+_worker = dict()
+
+
+def _start_worker(knowledge, query, symbols, prune):
+    """Compiles the sentences once for each worker process."""
+    _worker["kb"] = CompiledSentence(knowledge, symbols)
+    _worker["q"] = CompiledSentence(query, symbols)
+    _worker["prune"] = prune
+
+
+def _check_partition(partition):
+    """Checks entailment with the first k symbols fixed by `partition`."""
+    k, prefix = partition
+    t, f = prefix, ~prefix & ((1 << k) - 1)
+    return check_compiled(_worker["kb"], _worker["q"], k, t, f,
+                          _worker["prune"])
+
+
+def model_check_parallel(knowledge, query, processes=None, split=None,
+                         prune=True):
+    """
+    Checks if knowledge base entails query, using a pool of processes.
+
+    The models are split into 2 ** `split` partitions by fixing the first
+    `split` symbols, and each partition is checked in a worker. All workers
+    are stopped as soon as any partition holds a counter-model.
+    """
+    symbols = sorted(knowledge.symbols() | query.symbols())
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    # Use a few partitions per process, so uneven ones balance out
+    if split is None:
+        split = (4 * processes - 1).bit_length()
+    split = min(split, len(symbols))
+
+    partitions = [(split, prefix) for prefix in range(2 ** split)]
+    with multiprocessing.Pool(processes, _start_worker,
+                              (knowledge, query, symbols, prune)) as pool:
+        for holds in pool.imap_unordered(_check_partition, partitions):
+            if not holds:
+                pool.terminate()
+                return False
+    return True
+
+
+def model_check_all(knowledge, queries):
+    """
+    Checks which of several queries the knowledge base entails.
+
+    Every model is enumerated once, no matter how many queries are asked.
+    Returns a list of the queries that are entailed, in the order given.
+    """
+
+    def check_all():
+        """Rules out queries that are false in a model of the knowledge base."""
+        stack = [(0, 0, 0)]
+        while stack:
+            i, t, f = stack.pop()
+
+            # If model has an assignment for each symbol
+            if i == len(symbols):
+
+                # Any query false in a model of the knowledge base is not
+                # entailed
+                if kb.evaluate(t):
+                    for j, query in enumerate(compiled):
+                        if entailed[j] and not query.evaluate(t):
+                            entailed[j] = False
+
+                    # Stop early once every query has a counter-model
+                    if not any(entailed):
+                        return
+                continue
+
+            # No completion of the model satisfies the knowledge base
+            if kb.is_false(t, f):
+                continue
+
+            # Explore models where symbol i is true and where it is false
+            bit = 1 << i
+            stack.append((i + 1, t, f | bit))
+            stack.append((i + 1, t | bit, f))
+
+    queries = list(queries)
+    entailed = [True] * len(queries)
+
+    # Get all symbols in both knowledge and queries
+    symbols = sorted(frozenset().union(
+        knowledge.symbols(), *[query.symbols() for query in queries]
+    ))
+    kb = CompiledSentence(knowledge, symbols)
+    compiled = [CompiledSentence(query, symbols) for query in queries]
+
+    if any(entailed):
+        check_all()
+    return [query for j, query in enumerate(queries) if entailed[j]]
+
+
+# Clauses of each sentence and of its negation, computed by to_cnf
+_cnf = weakref.WeakKeyDictionary()
+
+
+def to_cnf(sentence, positive=True):
+    """
+    Converts a sentence, or its negation if not `positive`, to conjunctive
+    normal form.
+
+    Returns a frozenset of clauses. Each clause is a frozenset of literals,
+    and each literal is a (name, value) pair. Tautologies are left out.
+    """
+
+    def distribute(left, right):
+        """Returns the clauses of the disjunction of two clause sets."""
+        clauses = set()
+        for a in left:
+            for b in right:
+                clause = a | b
+                if not is_tautology(clause):
+                    clauses.add(clause)
+        return clauses
+
+    Sentence.validate(sentence)
+    cached = _cnf.get(sentence)
+    if cached is not None and cached[positive] is not None:
+        return cached[positive]
+
+    if isinstance(sentence, Symbol):
+        clauses = {frozenset({(sentence.name, positive)})}
+    elif isinstance(sentence, Not):
+        clauses = to_cnf(sentence.operand, not positive)
+    elif isinstance(sentence, (And, Or)):
+        parts = (sentence.conjuncts if isinstance(sentence, And)
+                 else sentence.disjuncts)
+
+        # A conjunction, or a negated disjunction, joins the clause sets
+        if isinstance(sentence, And) == positive:
+            clauses = set().union(*[to_cnf(part, positive) for part in parts])
+
+        # Otherwise the clause sets are distributed over each other
+        else:
+            clauses = {frozenset()}
+            for part in parts:
+                clauses = distribute(clauses, to_cnf(part, positive))
+    elif isinstance(sentence, Implication):
+        if positive:
+            clauses = distribute(to_cnf(sentence.antecedent, False),
+                                 to_cnf(sentence.consequent, True))
+        else:
+            clauses = (to_cnf(sentence.antecedent, True)
+                       | to_cnf(sentence.consequent, False))
+    elif isinstance(sentence, Biconditional):
+        left_true = to_cnf(sentence.left, True)
+        left_false = to_cnf(sentence.left, False)
+        clauses = (
+            distribute(left_false, to_cnf(sentence.right, positive))
+            | distribute(left_true, to_cnf(sentence.right, not positive))
+        )
+    else:
+        raise Exception(f"cannot convert {sentence}")
+
+    clauses = frozenset(clauses)
+
+    # Only cache sentences that can no longer change
+    if sentence._interned or not isinstance(sentence, (And, Or)):
+        cached = _cnf.setdefault(sentence, [None, None])
+        cached[positive] = clauses
+    return clauses
+
+
+def is_tautology(clause):
+    """Checks if a clause holds both a literal and its complement."""
+    return any((name, not value) in clause for name, value in clause)
+
+
+def clause_formula(clause):
+    """Returns string formula representing a clause."""
+    if not clause:
+        return "⊥"
+    literals = sorted(clause)
+    return " ∨ ".join([name if value else "¬" + Sentence.parenthesize(name)
+                       for name, value in literals])
+
+
+class ClauseIndex():
+    """
+    Set of clauses, indexed by the literals they contain.
+    """
+
+    def __init__(self):
+        self.clauses = set()
+        self.literals = dict()
+
+    def __len__(self):
+        return len(self.clauses)
+
+    def __contains__(self, clause):
+        return clause in self.clauses
+
+    def add(self, clause):
+        self.clauses.add(clause)
+        for literal in clause:
+            self.literals.setdefault(literal, set()).add(clause)
+
+    def remove(self, clause):
+        self.clauses.discard(clause)
+        for literal in clause:
+            self.literals.get(literal, set()).discard(clause)
+
+    def containing(self, literal):
+        """Returns the clauses that contain a literal."""
+        return self.literals.get(literal, ())
+
+    def subsumes(self, clause):
+        """Checks if some clause in the index is a subset of `clause`."""
+        for literal in clause:
+            for other in self.containing(literal):
+                if other <= clause:
+                    return True
+        return False
+
+    def subsumed_by(self, clause):
+        """Returns the clauses in the index that are supersets of `clause`."""
+        if not clause:
+            return set(self.clauses)
+        candidates = min((self.containing(literal) for literal in clause),
+                         key=len)
+        return {other for other in candidates if clause <= other}
+
+
+def resolve(usable, support):
+    """
+    Searches for a resolution refutation of the clauses `usable` and
+    `support`, using the set-of-support strategy: every resolution step
+    uses at least one clause derived from `support`.
+
+    Returns the derivation of the empty clause, as a list of steps
+    (resolvent, left, right), or None if the clauses are saturated.
+    """
+    parents = dict()
+
+    def proof(clause):
+        """Returns the steps deriving a clause, parents first."""
+        steps = []
+        stack = [(clause, False)]
+        seen = set()
+        while stack:
+            clause, expanded = stack.pop()
+            if clause not in parents:
+                continue
+            if expanded:
+                steps.append((clause, *parents[clause]))
+            elif clause not in seen:
+                seen.add(clause)
+                stack.append((clause, True))
+                stack.extend((parent, False) for parent in parents[clause])
+        return steps
+
+    # Keep only the most general of the input clauses
+    index = ClauseIndex()
+    for clause in sorted(set(usable), key=len):
+        if not is_tautology(clause) and not index.subsumes(clause):
+            index.add(clause)
+    if frozenset() in index:
+        return []
+
+    # Support clauses are chosen shortest first, oldest first
+    queue = []
+    waiting = ClauseIndex()
+    for clause in sorted(set(support), key=len):
+        if is_tautology(clause) or index.subsumes(clause):
+            continue
+        if not clause:
+            return []
+        if not waiting.subsumes(clause):
+            waiting.add(clause)
+            heapq.heappush(queue, (len(clause), len(parents) + len(queue),
+                                   clause))
+
+    count = len(queue)
+    while queue:
+        _, _, given = heapq.heappop(queue)
+        if given not in waiting:
+            continue
+        waiting.remove(given)
+        if index.subsumes(given):
+            continue
+
+        # Resolve against every clause holding a complementary literal
+        for name, value in given:
+            for other in list(index.containing((name, not value))):
+                resolvent = ((given - {(name, value)})
+                             | (other - {(name, not value)}))
+                if is_tautology(resolvent):
+                    continue
+                if resolvent in parents or resolvent in index:
+                    continue
+                parents[resolvent] = (given, other)
+                if not resolvent:
+                    return proof(resolvent)
+                if index.subsumes(resolvent) or waiting.subsumes(resolvent):
+                    continue
+
+                # Drop waiting clauses the resolvent is more general than
+                for clause in waiting.subsumed_by(resolvent):
+                    waiting.remove(clause)
+                waiting.add(resolvent)
+                count += 1
+                heapq.heappush(queue, (len(resolvent), count, resolvent))
+
+        # Drop processed clauses the given clause is more general than
+        for clause in index.subsumed_by(given):
+            index.remove(clause)
+        index.add(given)
+
+    return None
+
+
+def resolution_proof(knowledge, query):
+    """
+    Proves that knowledge base entails query by resolution refutation.
+
+    Returns the steps deriving the empty clause from the clauses of the
+    knowledge base and the negated query, as (resolvent, left, right)
+    triples of clauses, or None if query is not entailed.
+    """
+    usable = to_cnf(knowledge)
+    support = to_cnf(query, False)
+    steps = resolve(usable, support)
+
+    # Set of support is only complete when the knowledge base is
+    # satisfiable, so otherwise check the knowledge base alone
+    if steps is None:
+        steps = resolve((), usable)
+    return steps
+
+
+def resolution_check(knowledge, query):
+    """Checks if knowledge base entails query, using resolution."""
+    return resolution_proof(knowledge, query) is not None
+
+
+def format_proof(steps):
+    """Returns a string showing each step of a resolution proof."""
+    return "\n".join([
+        f"{clause_formula(left)}, {clause_formula(right)}"
+        f" ⊢ {clause_formula(clause)}"
+        for clause, left, right in steps
+    ])
+
+
+# Tokens of the notation printed by formula(), with ASCII aliases
+_tokens = re.compile(r"""
+    \s*(?:
+        (?P<operator><=>|<->|=>|->|/\\|\\/|[¬~!∧&∨|])
+      | (?P<paren>[()])
+      | (?P<name>[^\s()¬~!∧&∨|=<>/\\-](?:[^()¬~!∧&∨|=<>/\\-]*[^\s()¬~!∧&∨|=<>/\\-])?)
+    )\s*
+""", re.VERBOSE)
+
+# Operators by alias, and the precedence of each binary operator
+_operators = {
+    "¬": Not, "~": Not, "!": Not,
+    "∧": And, "&": And, "/\\": And,
+    "∨": Or, "|": Or, "\\/": Or,
+    "=>": Implication, "->": Implication,
+    "<=>": Biconditional, "<->": Biconditional
+}
+_precedence = {And: 4, Or: 3, Implication: 2, Biconditional: 1}
+
+
+def tokenize(text):
+    """
+    Yields the tokens of a formula as (kind, value) pairs, where kind is
+    "operator", "paren" or "name".
+    """
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _tokens.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"unexpected {text[position]!r} at position "
+                             f"{position} in {text!r}")
+        kind = match.lastgroup
+        yield kind, match.group(kind)
+        position = match.end()
+
+
+def parse(text):
+    """
+    Parses a formula into a logical sentence.
+
+    Accepts the notation printed by formula(), as well as the ASCII
+    aliases ~ or ! for ¬, & or /\\ for ∧, | or \\/ for ∨, -> for =>, and
+    <-> for <=>. ¬ binds tightest, then ∧, ∨, => and <=>; => groups to
+    the right and the others to the left. A run of the same ∧ or ∨
+    operator becomes a single And or Or.
+    """
+
+    # Parsed operands, and operators waiting for their right operand. An
+    # unparenthesized run of ∧ or ∨ is kept as (And or Or, list of parts)
+    # until it ends, and any other operand as (None, sentence)
+    operands = []
+    operators = []
+
+    def operand():
+        """Pops the top operand as a sentence."""
+        run, value = operands.pop()
+        return value if run is None else run(*value)
+
+    def reduce():
+        """Applies the operator on top of the stack."""
+        operator = operators.pop()
+        if operator is Not:
+            operands.append((None, Not(operand())))
+            return
+        right = operand()
+        if operator in (And, Or) and operands[-1][0] is operator:
+            operands[-1][1].append(right)
+        elif operator in (And, Or):
+            operands.append((operator, [operand(), right]))
+        else:
+            operands.append((None, operator(operand(), right)))
+
+    def binds_before(top, operator):
+        """Checks if operator `top` applies before binary `operator`."""
+        if top is Not:
+            return True
+        if top == "(":
+            return False
+        if operator is Implication:
+            return _precedence[top] > _precedence[operator]
+        return _precedence[top] >= _precedence[operator]
+
+    # Whether the next token should start an operand
+    expect_operand = True
+    for kind, value in tokenize(text):
+        if kind == "name":
+            if not expect_operand:
+                raise ValueError(f"missing operator before {value!r}")
+            operands.append((None, Symbol(value)))
+            expect_operand = False
+        elif value == "(":
+            if not expect_operand:
+                raise ValueError("missing operator before '('")
+            operators.append("(")
+        elif value == ")":
+            if expect_operand:
+                raise ValueError("missing operand before ')'")
+            while operators and operators[-1] != "(":
+                reduce()
+            if not operators:
+                raise ValueError("unbalanced ')'")
+            operators.pop()
+
+            # A parenthesized run is closed to further operands
+            operands.append((None, operand()))
+        else:
+            operator = _operators[value]
+            if operator is Not:
+                if not expect_operand:
+                    raise ValueError(f"missing operator before {value!r}")
+                operators.append(Not)
+                continue
+            if expect_operand:
+                raise ValueError(f"missing operand before {value!r}")
+            while operators and binds_before(operators[-1], operator):
+                reduce()
+            operators.append(operator)
+            expect_operand = True
+
+    if expect_operand:
+        raise ValueError(f"incomplete formula {text!r}")
+    while operators:
+        if operators[-1] == "(":
+            raise ValueError("unbalanced '('")
+        reduce()
+    return operand()
+
+
+def parse_file(filename):
+    """
+    Yields the sentence on each line of a file, one at a time.
+
+    Blank lines and lines starting with # are skipped.
+    """
+    with open(filename) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                yield parse(line)
+            except ValueError as e:
+                raise ValueError(f"{filename}, line {number}: {e}")
+
+
+def load_knowledge(filename):
+    """Returns a knowledge base of every sentence in a file, joined by And."""
+    knowledge = And()
+    for sentence in parse_file(filename):
+        knowledge.add(sentence)
+    return knowledge
@@ -89,9 +89,9 @@ def main():
         if len(knowledge.conjuncts) == 0:
             print("    Not yet implemented.")
         else:
-            for symbol in symbols:
-                if model_check(knowledge, symbol):
-                    print(f"    {symbol}")
+            knowledge = intern(knowledge)
+            for symbol in model_check_all(knowledge, symbols):
+                print(f"    {symbol}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+"""
+Minesweeper boards backed by NumPy arrays, for boards far larger than the
+list-based board in minesweeper.py handles well.
+"""
+import random
+
+import numpy as np
+
+from minesweeper import Minesweeper
+
+
+class NumpyMinesweeper(Minesweeper):
+    """
+    Minesweeper game representation, with the board and the number of
+    mines next to every cell held in NumPy arrays
+    """
+
+    def __init__(self, height=8, width=8, mines=8):
+
+        # Set initial width, height, and number of mines
+        self.height = height
+        self.width = width
+        if not 0 <= mines <= height * width:
+            raise ValueError(f"cannot place {mines} mines on a "
+                             f"{height}x{width} board")
+
+        # Draw distinct cells for mines, seeded from the random module so
+        # random.seed still fixes the game
+        rng = np.random.default_rng(random.getrandbits(64))
+        positions = rng.choice(height * width, size=mines, replace=False)
+        self.board = np.zeros((height, width), dtype=bool)
+        self.board.flat[positions] = True
+
+        # Count mines next to each cell by adding the eight shifted copies
+        # of a zero-padded board
+        padded = np.pad(self.board, 1).astype(np.uint8)
+        self.counts = np.zeros((height, width), dtype=np.uint8)
+        for di in range(3):
+            for dj in range(3):
+                if (di, dj) != (1, 1):
+                    self.counts += padded[di:di + height, dj:dj + width]
+
+        rows, columns = np.divmod(positions, width)
+        self.mines = set(zip(rows.tolist(), columns.tolist()))
+
+        # At first, player has found no mines
+        self.mines_found = set()
+
+    def is_mine(self, cell):
+        return bool(self.board[cell])
+
+    def nearby_mines(self, cell):
+        """
+        Returns the number of mines that are
+        within one row and column of a given cell,
+        not including the cell itself.
+        """
+        return int(self.counts[cell])
@@ -1,5 +1,8 @@
 import itertools
+import math
 import random
+import time
+from collections import deque
 from typing import no_type_check_decorator
 
 
@@ -78,6 +81,29 @@ class Minesweeper():
 
         return count
 
+    def reveal(self, cell, revealed=()):
+        """
+        Reveals a safe cell, and if no mines are next to it, every cell
+        next to it in turn, flooding out through cells with no nearby mines.
+
+        Cells in `revealed` are not revealed again. Returns a dict mapping
+        each newly revealed cell to its number of nearby mines.
+        """
+        counts = {cell: self.nearby_mines(cell)}
+        queue = deque([cell])
+        while queue:
+            i, j = queue.popleft()
+            if counts[(i, j)] != 0:
+                continue
+            for ni in range(max(i - 1, 0), min(i + 2, self.height)):
+                for nj in range(max(j - 1, 0), min(j + 2, self.width)):
+                    neighbor = (ni, nj)
+                    if neighbor in counts or neighbor in revealed:
+                        continue
+                    counts[neighbor] = self.nearby_mines(neighbor)
+                    queue.append(neighbor)
+        return counts
+
     def won(self):
         """
         Checks if all mines have been flagged.
@@ -99,6 +125,9 @@ class Sentence():
     def __eq__(self, other):
         return self.cells == other.cells and self.count == other.count
 
+    def __hash__(self):
+        return hash((frozenset(self.cells), self.count))
+
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
@@ -140,17 +169,199 @@ class Sentence():
         return
 
 
+class BitSentence():
+    """
+    Logical statement about a Minesweeper game, like Sentence, with its
+    cells stored as the bits of an int. Cell (i, j) is bit
+    i * width + j - offset, where offset is the index of the sentence's
+    first cell, so masks stay as small as the stretch of board the
+    sentence covers. Subset, difference and intersection tests are then
+    a few operations on small ints.
+    """
+
+    __slots__ = ("mask", "offset", "count", "width", "_cells", "_hash")
+
+    def __init__(self, mask, count, width, offset=0, cells=None):
+        self.count = count
+        self.width = width
+        self.set_mask(mask, offset)
+        self._cells = cells
+
+    @classmethod
+    def from_cells(cls, cells, count, width):
+        indexes = [i * width + j for i, j in cells]
+        offset = min(indexes, default=0)
+        mask = 0
+        for index in indexes:
+            mask |= 1 << (index - offset)
+        return cls(mask, count, width, offset, frozenset(cells))
+
+    def set_mask(self, mask, offset):
+        """
+        Sets the sentence's cells, shifting the mask so that its lowest
+        bit is the first cell. Equal sentences then have equal masks. The
+        decoded cells and the hash are recomputed when next needed.
+        """
+        if mask:
+            low = (mask & -mask).bit_length() - 1
+            mask >>= low
+            offset += low
+        else:
+            offset = 0
+        self.mask = mask
+        self.offset = offset
+        self._hash = None
+
+    def aligned(self, other):
+        """
+        Returns the masks of this sentence and `other` shifted to a common
+        offset, and that offset.
+        """
+        offset = min(self.offset, other.offset)
+        return (self.mask << (self.offset - offset),
+                other.mask << (other.offset - offset), offset)
+
+    def __eq__(self, other):
+        return (self.mask == other.mask and self.offset == other.offset
+                and self.count == other.count)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.mask, self.offset, self.count))
+        return self._hash
+
+    def __str__(self):
+        return f"{self.cells} = {self.count}"
+
+    def __len__(self):
+        return self.mask.bit_count()
+
+    @property
+    def cells(self):
+        """
+        The set of board cells in the sentence. Sentences made from cells
+        or from other sentences are given it, and others decode it from the
+        mask when first needed.
+        """
+        if self._cells is None:
+            cells = set()
+            mask = self.mask
+            while mask:
+                low = mask & -mask
+                cells.add(divmod(self.offset + low.bit_length() - 1,
+                                 self.width))
+                mask ^= low
+            self._cells = frozenset(cells)
+        return self._cells
+
+    def bit(self, cell):
+        i, j = cell
+        index = i * self.width + j - self.offset
+        return 1 << index if index >= 0 else 0
+
+    def known_mines(self):
+        """
+        Returns the set of all cells in self.cells known to be mines.
+        """
+        if len(self) == self.count:
+            return set(self.cells)
+        return set()
+
+    def known_safes(self):
+        """
+        Returns the set of all cells in self.cells known to be safe.
+        """
+        if self.count == 0:
+            return set(self.cells)
+        return set()
+
+    def mark_mine(self, cell):
+        """
+        Updates internal knowledge representation given the fact that
+        a cell is known to be a mine.
+        """
+        bit = self.bit(cell)
+        if self.mask & bit:
+            self.count -= 1
+            self.set_mask(self.mask ^ bit, self.offset)
+            self._cells = self.cells - {cell}
+
+    def mark_safe(self, cell):
+        """
+        Updates internal knowledge representation given the fact that
+        a cell is known to be safe.
+        """
+        bit = self.bit(cell)
+        if self.mask & bit:
+            self.set_mask(self.mask ^ bit, self.offset)
+            self._cells = self.cells - {cell}
+
+
+class CellPool():
+    """
+    Set of cells kept in a list, with each cell's position in the list,
+    so that adding, removing and picking a random cell all take constant
+    time. A cell is removed by moving the last cell into its place.
+    """
+
+    __slots__ = ("cells", "positions")
+
+    def __init__(self, cells=()):
+        self.cells = []
+        self.positions = dict()
+        for cell in cells:
+            self.add(cell)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, cell):
+        return cell in self.positions
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def add(self, cell):
+        if cell not in self.positions:
+            self.positions[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def discard(self, cell):
+        position = self.positions.pop(cell, None)
+        if position is None:
+            return
+        last = self.cells.pop()
+        if position < len(self.cells):
+            self.cells[position] = last
+            self.positions[last] = position
+
+    def any(self):
+        """
+        Returns some cell in the pool, or None if it is empty.
+        """
+        return self.cells[-1] if self.cells else None
+
+    def choice(self):
+        """
+        Returns a random cell in the pool, or None if it is empty.
+        """
+        return random.choice(self.cells) if self.cells else None
+
+
 class MinesweeperAI():
     """
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, mines=None):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Number of mines on the board, if known
+        self.total_mines = mines
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
@@ -158,8 +369,46 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Cells neither chosen nor known to be mines, and safe cells not
+        # yet chosen, so moves can be found without scanning the board
+        self.unknown = CellPool(
+            (i, j) for i in range(height) for j in range(width)
+        )
+        self.safe_moves = CellPool()
+
+        # Set of sentences about the game known to be true
+        self.knowledge = set()
+
+        # Maps each cell to the sentences in the knowledge that contain it
+        self.cell_sentences = dict()
+
+        # Sentences added or changed since inference last looked at them
+        self.pending = deque()
+
+        # Solutions of components already solved, by their sentences
+        self.component_tables = dict()
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge, indexes it by its cells, and
+        queues it for inference. Empty and duplicate sentences are ignored.
+        """
+        if not sentence.mask or sentence in self.knowledge:
+            return
+        self.knowledge.add(sentence)
+        for cell in sentence.cells:
+            self.cell_sentences.setdefault(cell, set()).add(sentence)
+        self.pending.append(sentence)
+
+    def remove_sentence(self, sentence):
+        """
+        Removes a sentence from the knowledge and from the index.
+        """
+        self.knowledge.discard(sentence)
+        for cell in sentence.cells:
+            sentences = self.cell_sentences.get(cell)
+            if sentences is not None:
+                sentences.discard(sentence)
 
     def mark_mine(self, cell):
         """
@@ -167,8 +416,15 @@ class MinesweeperAI():
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
+        self.unknown.discard(cell)
+
+        # Once marked, the cell is removed from every sentence holding it.
+        # Sentences are hashed by their contents, so each one is taken out
+        # of the knowledge while it changes
+        for sentence in self.cell_sentences.pop(cell, ()):
+            self.remove_sentence(sentence)
             sentence.mark_mine(cell)
+            self.add_sentence(sentence)
 
     def mark_safe(self, cell):
         """
@@ -176,8 +432,20 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        if cell not in self.moves_made:
+            self.safe_moves.add(cell)
+        for sentence in self.cell_sentences.pop(cell, ()):
+            self.remove_sentence(sentence)
             sentence.mark_safe(cell)
+            self.add_sentence(sentence)
+
+    def mark_move(self, cell):
+        """
+        Marks a cell as a move that has been made.
+        """
+        self.moves_made.add(cell)
+        self.unknown.discard(cell)
+        self.safe_moves.discard(cell)
 
     def add_knowledge(self, cell, count):
         """
@@ -195,50 +463,78 @@ class MinesweeperAI():
                if they can be inferred from existing knowledge
         """
         # 1) mark the cell as a move that has been made
-        self.moves_made.add(cell)
+        self.mark_move(cell)
 
         # 2) mark the cell as safe
         self.mark_safe(cell)
-        
+
         # 3) add a new sentence to the AI's knowledge base
         #    based on the value of `cell` and `count`
         neighbors, count = self.get_neighbors(cell, count)
-        if len(neighbors) != 0:
-            self.knowledge.append(Sentence(neighbors, count))
-        
-            # 4) mark any additional cells as safe or as mines
-            #    if it can be concluded based on the AI's knowledge base
+        self.add_sentence(BitSentence.from_cells(neighbors, count, self.width))
 
-            for sentence in self.knowledge:
-                for mine in sentence.known_mines():
-                    if mine not in self.mines:
-                        self.mark_mine(mine)
+        # 4) and 5) run inference until nothing more can be concluded
+        self.propagate()
 
-                for safe in sentence.known_safes():
-                    if safe not in self.safes:
-                        self.mark_safe(safe)
-        
-        # 5) add any new sentences to the AI's knowledge base
-        #    if they can be inferred from existing knowledge
+    def add_knowledge_batch(self, counts):
+        """
+        Called with a dict mapping safe cells, such as those returned by
+        Minesweeper.reveal, to how many neighboring cells have mines in
+        them. Adds them all as add_knowledge would, but runs inference
+        once for the whole batch.
+        """
+        for cell in counts:
+            self.mark_move(cell)
+            self.mark_safe(cell)
+        for cell, count in counts.items():
+            neighbors, count = self.get_neighbors(cell, count)
+            self.add_sentence(
+                BitSentence.from_cells(neighbors, count, self.width)
+            )
+        self.propagate()
+
+    def propagate(self):
+        """
+        Draws conclusions from every sentence added or changed since the
+        last call, until no new mines, safes or sentences can be inferred.
+        """
+        while self.pending:
+            sentence = self.pending.popleft()
 
-        # remove empty sentences
-        self.knowledge = [x for x in self.knowledge if len(x.cells) > 0]
-        
-        # remove subsets and make new knowledge
-        if len(self.knowledge) >= 2:
-            newKnowledge = []
-            for outside in self.knowledge:
-                for inside in self.knowledge:
-                    if inside.cells < outside.cells:
-                        newKnowledge.append(Sentence(outside.cells - inside.cells, outside.count - inside.count))
-
-            # add new knowledge if it's not duplicate. 
-            while len(newKnowledge) > 0:
-                knowlege = newKnowledge.pop()
-                if knowlege not in self.knowledge:
-                    self.knowledge.append(knowlege)
+            # Skip sentences emptied or replaced since they were queued
+            if not sentence.mask or sentence not in self.knowledge:
+                continue
 
-        return
+            # Marking cells changes this sentence and its neighbors, which
+            # puts them back on the queue
+            mines = sentence.known_mines()
+            safes = sentence.known_safes()
+            for mine in mines:
+                self.mark_mine(mine)
+            for safe in safes:
+                self.mark_safe(safe)
+            if mines or safes:
+                continue
+
+            # Only sentences sharing a cell can be subsets or supersets
+            others = set()
+            for cell in sentence.cells:
+                others.update(self.cell_sentences.get(cell, ()))
+            for other in others:
+                mask, other_mask, offset = sentence.aligned(other)
+                if other_mask == mask:
+                    continue
+                common = other_mask & mask
+                if common == other_mask:
+                    self.add_sentence(BitSentence(
+                        mask ^ common, sentence.count - other.count,
+                        self.width, offset, sentence.cells - other.cells
+                    ))
+                elif common == mask:
+                    self.add_sentence(BitSentence(
+                        other_mask ^ common, other.count - sentence.count,
+                        self.width, offset, other.cells - sentence.cells
+                    ))
 
     def make_safe_move(self):
         """
@@ -249,12 +545,7 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        for move in self.safes:
-            if move in self.moves_made:
-                continue
-            else:
-                return move
-        return
+        return self.safe_moves.any()
 
     def make_random_move(self):
         """
@@ -263,16 +554,248 @@ class MinesweeperAI():
             1) have not already been chosen, and
             2) are not known to be mines
         """
-        while True:
-            if (self.height * self.width) == len(self.moves_made) + len(self.mines):
-                return None
-            i = random.randint(0,self.height - 1 )
-            j = random.randint(0,self.width -1 )
+        return self.unknown.choice()
 
-            if (i, j) in self.moves_made or (i, j) in self.mines:
+    def make_guess_move(self, time_budget=0.1):
+        """
+        Returns the move least likely to be a mine, among cells that
+        have not already been chosen and are not known to be mines.
+
+        Falls back to a random move when no probabilities can be found.
+        """
+        probabilities = self.mine_probabilities(time_budget)
+        if not probabilities:
+            return self.make_random_move()
+        lowest = min(probabilities.values())
+        return random.choice(sorted(
+            cell for cell, p in probabilities.items() if p == lowest
+        ))
+
+    def mine_probabilities(self, time_budget=0.1, max_cells=48):
+        """
+        Returns a dict mapping each cell that has not been chosen and is
+        not known to be a mine to the probability that it is a mine.
+
+        Cells in the knowledge are split into components that share no
+        sentence, and the solutions of each are counted exactly. If the
+        number of mines on the board is known, solutions are weighted by
+        the number of ways to place the remaining mines on the other
+        cells. Components over `max_cells` cells, or that cannot be solved
+        within `time_budget` seconds, are estimated from their sentences.
+        """
+        deadline = time.perf_counter() + time_budget
+        unknown = set(self.unknown)
+        probabilities = {cell: 0 for cell in self.safes & unknown}
+
+        # Solve each component, or estimate it if it is too hard
+        tables = []
+        estimated = False
+        frontier = set()
+        for sentences in self.components():
+            cells = set().union(*[sentence.cells for sentence in sentences])
+            frontier |= cells
+            table = None
+            if len(cells) <= max_cells:
+                try:
+                    table = self.solve_component(sentences, deadline)
+                except TimeoutError:
+                    pass
+            if table is None:
+                estimated = True
+                probabilities.update(self.estimate_component(sentences))
+            else:
+                tables.append(table)
+
+        interior = unknown - frontier - self.safes
+        remaining = (None if self.total_mines is None
+                     else self.total_mines - len(self.mines))
+
+        # Without a mine count to weight by, components are independent
+        if remaining is None or estimated:
+            expected = sum(probabilities[cell] for cell in frontier
+                           if cell in probabilities)
+            for table in tables:
+                total = sum(count for count, _ in table.values())
+                for mines, (count, cell_counts) in table.items():
+                    expected += mines * count / total
+                    for cell, cell_count in cell_counts.items():
+                        probabilities[cell] = (probabilities.get(cell, 0)
+                                               + cell_count / total)
+            if interior:
+                if remaining is None:
+                    density = expected / len(frontier) if frontier else 0.5
+                else:
+                    density = (remaining - expected) / len(interior)
+                for cell in interior:
+                    probabilities[cell] = min(max(density, 0), 1)
+            return probabilities
+
+        def ways(mines):
+            """Counts the ways to place the rest of the mines in interior."""
+            rest = remaining - mines
+            if rest < 0 or rest > len(interior):
+                return 0
+            return math.comb(len(interior), rest)
+
+        def convolve(a, b):
+            """Combines two distributions of mine counts."""
+            result = dict()
+            for m, x in a.items():
+                for n, y in b.items():
+                    result[m + n] = result.get(m + n, 0) + x * y
+            return result
+
+        # Mine count distributions of every component but one, built from
+        # distributions of the components before and after it
+        counts = [{m: count for m, (count, _) in table.items()}
+                  for table in tables]
+        before = [{0: 1}]
+        for distribution in counts:
+            before.append(convolve(before[-1], distribution))
+        after = [{0: 1}]
+        for distribution in reversed(counts):
+            after.append(convolve(after[-1], distribution))
+        after.reverse()
+
+        total = sum(x * ways(m) for m, x in before[-1].items())
+        if total == 0:
+            return probabilities
+
+        for k, table in enumerate(tables):
+            others = convolve(before[k], after[k + 1])
+            for mines, (_, cell_counts) in table.items():
+                weight = sum(x * ways(mines + m) for m, x in others.items())
+                for cell, cell_count in cell_counts.items():
+                    probabilities[cell] = (probabilities.get(cell, 0)
+                                           + cell_count * weight / total)
+
+        if interior:
+            expected = sum(x * ways(m) * (remaining - m)
+                           for m, x in before[-1].items())
+            for cell in interior:
+                probabilities[cell] = expected / total / len(interior)
+        return probabilities
+
+    def components(self):
+        """
+        Returns the knowledge split into lists of sentences, where
+        sentences in different lists share no cell.
+        """
+        components = []
+        seen = set()
+        for sentence in self.knowledge:
+            if sentence in seen:
                 continue
+            seen.add(sentence)
+            component = []
+            queue = [sentence]
+            while queue:
+                current = queue.pop()
+                component.append(current)
+                for cell in current.cells:
+                    for other in self.cell_sentences.get(cell, ()):
+                        if other not in seen:
+                            seen.add(other)
+                            queue.append(other)
+            components.append(component)
+        return components
+
+    def solve_component(self, sentences, deadline=None):
+        """
+        Counts the assignments of mines to the cells of `sentences` that
+        satisfy all of them.
 
-            return (i, j)
+        Returns a dict mapping each number of mines to a pair: the number
+        of solutions with that many mines, and a dict mapping each cell to
+        the number of those solutions in which it is a mine. Raises
+        TimeoutError if still working after `deadline`.
+        """
+        key = frozenset((sentence.mask, sentence.offset, sentence.count)
+                        for sentence in sentences)
+        if key in self.component_tables:
+            return self.component_tables[key]
+
+        # Order cells so that each sentence's cells are close together,
+        # letting sentences be checked and closed early
+        cells = []
+        placed = set()
+        for sentence in sentences:
+            for cell in sorted(sentence.cells):
+                if cell not in placed:
+                    placed.add(cell)
+                    cells.append(cell)
+        index = {cell: n for n, cell in enumerate(cells)}
+
+        # For each cell, the sentences it is in and how many of their
+        # cells come after it
+        constraints = [sorted(index[cell] for cell in sentence.cells)
+                       for sentence in sentences]
+        targets = [sentence.count for sentence in sentences]
+        checks = [[] for _ in cells]
+        for c, members in enumerate(constraints):
+            for rank, n in enumerate(members):
+                checks[n].append((c, len(members) - rank - 1))
+
+        # Sentences with cells both before and after each position
+        active = [[c for c, members in enumerate(constraints)
+                   if members[0] < n <= members[-1]]
+                  for n in range(len(cells) + 1)]
+
+        have = [0] * len(constraints)
+        memo = dict()
+
+        def solve(n):
+            """
+            Returns the solutions for cells n onwards, as a dict mapping
+            mines to (solutions, mine counts for each of those cells).
+            """
+            if n == len(cells):
+                return {0: (1, [])}
+            state = (n, tuple(have[c] for c in active[n]))
+            if state in memo:
+                return memo[state]
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeoutError("component took too long to solve")
+
+            table = dict()
+            for value in (0, 1):
+                if not all(0 <= targets[c] - have[c] - value <= left
+                           for c, left in checks[n]):
+                    continue
+                for c, _ in checks[n]:
+                    have[c] += value
+                for mines, (count, cell_counts) in solve(n + 1).items():
+                    total, counts = table.get(
+                        mines + value, (0, [0] * (len(cells) - n))
+                    )
+                    counts[0] += count * value
+                    for k, cell_count in enumerate(cell_counts, 1):
+                        counts[k] += cell_count
+                    table[mines + value] = (total + count, counts)
+                for c, _ in checks[n]:
+                    have[c] -= value
+
+            memo[state] = table
+            return table
+
+        table = {
+            mines: (count, dict(zip(cells, cell_counts)))
+            for mines, (count, cell_counts) in solve(0).items()
+        }
+        self.component_tables[key] = table
+        return table
+
+    def estimate_component(self, sentences):
+        """
+        Estimates the mine probability of each cell in `sentences` as the
+        highest share of mines among the sentences it is in.
+        """
+        estimates = dict()
+        for sentence in sentences:
+            share = sentence.count / len(sentence.cells)
+            for cell in sentence.cells:
+                estimates[cell] = max(estimates.get(cell, 0), share)
+        return estimates
 
     def get_neighbors(self, cell, count):
         # Loop over all cells within one row and column
@@ -8,6 +8,9 @@ HEIGHT = 8
 WIDTH = 8
 MINES = 8
 
+# Frames drawn per second at most
+FPS = 30
+
 # Colors
 BLACK = (0, 0, 0)
 GRAY = (180, 180, 180)
@@ -37,29 +40,100 @@ flag = pygame.transform.scale(flag, (cell_size, cell_size))
 mine = pygame.image.load("assets/images/mine.png")
 mine = pygame.transform.scale(mine, (cell_size, cell_size))
 
+# Pre-render a number for every possible count of nearby mines
+numbers = [smallFont.render(str(n), True, BLACK) for n in range(9)]
+
+# Rectangles of the cells, buttons and status text, which never move
+cells = [
+    [
+        pygame.Rect(
+            board_origin[0] + j * cell_size,
+            board_origin[1] + i * cell_size,
+            cell_size, cell_size
+        )
+        for j in range(WIDTH)
+    ]
+    for i in range(HEIGHT)
+]
+aiButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height - 50,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+resetButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 20,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+statusRect = pygame.Rect(0, 0, (width / 3) - BOARD_PADDING * 2, 50)
+statusRect.center = ((5 / 6) * width, (2 / 3) * height)
+
+
+def cell_at(position):
+    """Returns the cell under a screen position, or None if off the board."""
+    x, y = position
+    i = (y - board_origin[1]) // cell_size
+    j = (x - board_origin[0]) // cell_size
+    if 0 <= i < HEIGHT and 0 <= j < WIDTH:
+        return (i, j)
+    return None
+
+
+def draw_cell(cell):
+    """Draws a cell with its mine, flag, or number, and returns its rect."""
+    i, j = cell
+    rect = cells[i][j]
+    pygame.draw.rect(screen, GRAY, rect)
+    pygame.draw.rect(screen, WHITE, rect, 3)
+    if lost and game.is_mine(cell):
+        screen.blit(mine, rect)
+    elif cell in flags:
+        screen.blit(flag, rect)
+    elif cell in revealed:
+        number = numbers[game.nearby_mines(cell)]
+        numberRect = number.get_rect()
+        numberRect.center = rect.center
+        screen.blit(number, numberRect)
+    return rect
+
+
+def draw_button(rect, label):
+    """Draws a button with a label."""
+    buttonText = mediumFont.render(label, True, BLACK)
+    buttonRect = buttonText.get_rect()
+    buttonRect.center = rect.center
+    pygame.draw.rect(screen, WHITE, rect)
+    screen.blit(buttonText, buttonRect)
+
+
 # Create game and AI agent
 game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-ai = MinesweeperAI(height=HEIGHT, width=WIDTH)
+ai = MinesweeperAI(height=HEIGHT, width=WIDTH, mines=MINES)
 
 # Keep track of revealed cells, flagged cells, and if a mine was hit
 revealed = set()
 flags = set()
 lost = False
 
+# Cells to draw on the next frame, whether the whole screen needs drawing,
+# and the status text on screen
+dirty = set()
+redraw = True
+shown = None
+
 # Show instructions initially
 instructions = True
+clock = pygame.time.Clock()
 
 while True:
+    clock.tick(FPS)
 
     # Check if game quit
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             sys.exit()
 
-    screen.fill(BLACK)
-
     # Show game instructions
     if instructions:
+        screen.fill(BLACK)
 
         # Title
         title = largeFont.render("Play Minesweeper", True, WHITE)
@@ -81,11 +155,7 @@ while True:
 
         # Play game button
         buttonRect = pygame.Rect((width / 4), (3 / 4) * height, width / 2, 50)
-        buttonText = mediumFont.render("Play Game", True, BLACK)
-        buttonTextRect = buttonText.get_rect()
-        buttonTextRect.center = buttonRect.center
-        pygame.draw.rect(screen, WHITE, buttonRect)
-        screen.blit(buttonText, buttonTextRect)
+        draw_button(buttonRect, "Play Game")
 
         # Check if play button clicked
         click, _, _ = pygame.mouse.get_pressed()
@@ -98,82 +168,20 @@ while True:
         pygame.display.flip()
         continue
 
-    # Draw board
-    cells = []
-    for i in range(HEIGHT):
-        row = []
-        for j in range(WIDTH):
-
-            # Draw rectangle for cell
-            rect = pygame.Rect(
-                board_origin[0] + j * cell_size,
-                board_origin[1] + i * cell_size,
-                cell_size, cell_size
-            )
-            pygame.draw.rect(screen, GRAY, rect)
-            pygame.draw.rect(screen, WHITE, rect, 3)
-
-            # Add a mine, flag, or number if needed
-            if game.is_mine((i, j)) and lost:
-                screen.blit(mine, rect)
-            elif (i, j) in flags:
-                screen.blit(flag, rect)
-            elif (i, j) in revealed:
-                neighbors = smallFont.render(
-                    str(game.nearby_mines((i, j))),
-                    True, BLACK
-                )
-                neighborsTextRect = neighbors.get_rect()
-                neighborsTextRect.center = rect.center
-                screen.blit(neighbors, neighborsTextRect)
-
-            row.append(rect)
-        cells.append(row)
-
-    # AI Move button
-    aiButton = pygame.Rect(
-        (2 / 3) * width + BOARD_PADDING, (1 / 3) * height - 50,
-        (width / 3) - BOARD_PADDING * 2, 50
-    )
-    buttonText = mediumFont.render("AI Move", True, BLACK)
-    buttonRect = buttonText.get_rect()
-    buttonRect.center = aiButton.center
-    pygame.draw.rect(screen, WHITE, aiButton)
-    screen.blit(buttonText, buttonRect)
-
-    # Reset button
-    resetButton = pygame.Rect(
-        (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 20,
-        (width / 3) - BOARD_PADDING * 2, 50
-    )
-    buttonText = mediumFont.render("Reset", True, BLACK)
-    buttonRect = buttonText.get_rect()
-    buttonRect.center = resetButton.center
-    pygame.draw.rect(screen, WHITE, resetButton)
-    screen.blit(buttonText, buttonRect)
-
-    # Display text
-    text = "Lost" if lost else "Won" if game.mines == flags else ""
-    text = mediumFont.render(text, True, WHITE)
-    textRect = text.get_rect()
-    textRect.center = ((5 / 6) * width, (2 / 3) * height)
-    screen.blit(text, textRect)
-
     move = None
 
     left, _, right = pygame.mouse.get_pressed()
 
     # Check for a right-click to toggle flagging
     if right == 1 and not lost:
-        mouse = pygame.mouse.get_pos()
-        for i in range(HEIGHT):
-            for j in range(WIDTH):
-                if cells[i][j].collidepoint(mouse) and (i, j) not in revealed:
-                    if (i, j) in flags:
-                        flags.remove((i, j))
-                    else:
-                        flags.add((i, j))
-                    time.sleep(0.2)
+        cell = cell_at(pygame.mouse.get_pos())
+        if cell is not None and cell not in revealed:
+            if cell in flags:
+                flags.remove(cell)
+            else:
+                flags.add(cell)
+            dirty.add(cell)
+            time.sleep(0.2)
 
     elif left == 1:
         mouse = pygame.mouse.get_pos()
@@ -182,12 +190,13 @@ while True:
         if aiButton.collidepoint(mouse) and not lost:
             move = ai.make_safe_move()
             if move is None:
-                move = ai.make_random_move()
+                move = ai.make_guess_move()
                 if move is None:
+                    dirty |= flags ^ ai.mines
                     flags = ai.mines.copy()
                     print("No moves left to make.")
                 else:
-                    print("No known safe moves, AI making random move.")
+                    print("No known safe moves, AI guessing the move least likely to be a mine.")
             else:
                 print("AI making safe move.")
             time.sleep(0.2)
@@ -195,28 +204,61 @@ while True:
         # Reset game state
         elif resetButton.collidepoint(mouse):
             game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-            ai = MinesweeperAI(height=HEIGHT, width=WIDTH)
+            ai = MinesweeperAI(height=HEIGHT, width=WIDTH, mines=MINES)
             revealed = set()
             flags = set()
             lost = False
-            continue
+            redraw = True
 
         # User-made move
         elif not lost:
-            for i in range(HEIGHT):
-                for j in range(WIDTH):
-                    if (cells[i][j].collidepoint(mouse)
-                            and (i, j) not in flags
-                            and (i, j) not in revealed):
-                        move = (i, j)
+            cell = cell_at(mouse)
+            if cell is not None and cell not in flags and cell not in revealed:
+                move = cell
 
     # Make move and update AI knowledge
     if move:
         if game.is_mine(move):
             lost = True
+            dirty |= game.mines
         else:
-            nearby = game.nearby_mines(move)
-            revealed.add(move)
-            ai.add_knowledge(move, nearby)
+            # Flood fills stop at flagged cells, as clicks do. A flag on the
+            # cell moved on, which only the AI can pick, was wrong
+            counts = game.reveal(move, revealed | flags)
+            revealed.update(counts)
+            flags.discard(move)
+            ai.add_knowledge_batch(counts)
+            dirty.update(counts)
+
+    # Draw everything after the instructions or a reset, and afterwards
+    # only what changed
+    updated = []
+    if redraw:
+        screen.fill(BLACK)
+        for i in range(HEIGHT):
+            for j in range(WIDTH):
+                draw_cell((i, j))
+        draw_button(aiButton, "AI Move")
+        draw_button(resetButton, "Reset")
+        updated.append(screen.get_rect())
+        shown = None
+    else:
+        updated.extend(draw_cell(cell) for cell in dirty)
+    dirty.clear()
 
-    pygame.display.flip()
+    # Display text
+    status = "Lost" if lost else "Won" if game.mines == flags else ""
+    if status != shown:
+        pygame.draw.rect(screen, BLACK, statusRect)
+        text = mediumFont.render(status, True, WHITE)
+        textRect = text.get_rect()
+        textRect.center = statusRect.center
+        screen.blit(text, textRect)
+        updated.append(statusRect)
+        shown = status
+
+    if redraw:
+        pygame.display.flip()
+        redraw = False
+    elif updated:
+        pygame.display.update(updated)
@@ -0,0 +1,160 @@
+"""
+Plays many games of Minesweeper with MinesweeperAI, without pygame, and
+reports statistics as JSON.
+
+Usage: python simulate.py [games] [--height H] [--width W] [--mines M]
+                          [--processes P] [--seed S] [--random-guesses]
+                          [--numpy]
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+
+def play_game(seed, height=8, width=8, mines=8, guess=True,
+              board=Minesweeper):
+    """
+    Plays one game on a `board` game class, with the random number
+    generator seeded by `seed` so the same seed always plays the same game.
+
+    Each move reveals a cell, flooding out through cells with no nearby
+    mines, and hands all the revealed cells to the AI at once. Returns a
+    dict with whether the game was won, the number of moves, the time taken
+    by each call to add_knowledge_batch and the number of sentences in the
+    knowledge after it.
+    """
+    random.seed(seed)
+    game = board(height=height, width=width, mines=mines)
+    ai = MinesweeperAI(height=height, width=width,
+                       mines=mines if guess else None)
+
+    safe_cells = height * width - mines
+    revealed = set()
+    latencies = []
+    sizes = []
+    won = False
+    while True:
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_guess_move() if guess else ai.make_random_move()
+        if move is None or game.is_mine(move):
+            break
+
+        counts = game.reveal(move, revealed)
+        start = time.perf_counter()
+        ai.add_knowledge_batch(counts)
+        latencies.append(time.perf_counter() - start)
+        sizes.append(len(ai.knowledge))
+
+        revealed.update(counts)
+        if len(revealed) == safe_cells:
+            won = True
+            break
+
+    return {
+        "seed": seed,
+        "won": won,
+        "moves": len(latencies),
+        "latencies": latencies,
+        "sizes": sizes
+    }
+
+
+def percentile(values, fraction):
+    """Returns the value below which `fraction` of sorted `values` fall."""
+    if not values:
+        return 0
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def simulate(games, height=8, width=8, mines=8, processes=None, seed=0,
+             guess=True, board=Minesweeper):
+    """
+    Plays `games` games across a pool of `processes` processes, seeding
+    game n with `seed` + n.
+
+    Returns a dict of statistics: win rate, latency of the AI update in
+    milliseconds, size of the knowledge, and throughput.
+    """
+    play = functools.partial(play_game, height=height, width=width,
+                             mines=mines, guess=guess, board=board)
+    seeds = range(seed, seed + games)
+    processes = processes or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    if processes == 1:
+        results = list(map(play, seeds))
+    else:
+        chunksize = max(1, games // (processes * 8))
+        with multiprocessing.Pool(processes) as pool:
+            results = list(pool.imap_unordered(play, seeds, chunksize))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(
+        latency for result in results for latency in result["latencies"]
+    )
+    sizes = [size for result in results for size in result["sizes"]]
+    wins = sum(result["won"] for result in results)
+    moves = len(latencies)
+
+    return {
+        "games": games,
+        "board": {"height": height, "width": width, "mines": mines},
+        "board_class": board.__name__,
+        "guess": "probability" if guess else "random",
+        "processes": processes,
+        "wins": wins,
+        "win_rate": wins / games if games else 0,
+        "moves": moves,
+        "latency_ms": {
+            "mean": 1000 * sum(latencies) / moves if moves else 0,
+            "p50": 1000 * percentile(latencies, 0.5),
+            "p99": 1000 * percentile(latencies, 0.99),
+            "max": 1000 * (latencies[-1] if latencies else 0)
+        },
+        "knowledge_size": {
+            "mean": sum(sizes) / len(sizes) if sizes else 0,
+            "max": max(sizes, default=0)
+        },
+        "seconds": elapsed,
+        "games_per_second": games / elapsed if elapsed else 0,
+        "moves_per_second": moves / elapsed if elapsed else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play Minesweeper games with the AI, without pygame."
+    )
+    parser.add_argument("games", type=int, nargs="?", default=1000)
+    parser.add_argument("--height", type=int, default=8)
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--mines", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--random-guesses", action="store_true",
+                        help="guess at random instead of by probability")
+    parser.add_argument("--numpy", action="store_true",
+                        help="use the NumPy board from board.py")
+    args = parser.parse_args()
+
+    board = Minesweeper
+    if args.numpy:
+        from board import NumpyMinesweeper
+        board = NumpyMinesweeper
+
+    stats = simulate(args.games, height=args.height, width=args.width,
+                     mines=args.mines, processes=args.processes,
+                     seed=args.seed, guess=not args.random_guesses,
+                     board=board)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+"""
+Exact inference for heredity by variable elimination.
+
+Instead of enumerating every assignment of genes and traits, the pedigree
+is treated as a Bayesian network with one gene variable per person. Each
+person contributes one factor: the probability of their gene count given
+their parents' (or unconditionally, for people without parents), times the
+probability of their trait if it was observed. Variables are eliminated in
+min-fill order, and the messages passed while eliminating are passed back
+down again, so every person's marginal comes out of one pass each way.
+
+PosteriorQuery keeps the messages between queries, so observing one more
+trait only recomputes the messages that depend on it.
+
+Usage: python elimination.py data.csv
+"""
+import heapq
+import itertools
+import sys
+
+from heredity import PROBS, load_data, log
+
+# Values of each gene variable, in the order tables are laid out
+GENES = (0, 1, 2)
+
+
+class Factor():
+    """
+    Table of non-negative numbers over assignments of gene counts to
+    some variables. The value for assignment (g1, ..., gk) of
+    `variables` is values[g1 * 3 ** (k - 1) + ... + gk].
+    """
+
+    __slots__ = ("variables", "values")
+
+    def __init__(self, variables, values):
+        self.variables = tuple(variables)
+        self.values = list(values)
+
+    def __repr__(self):
+        return f"Factor({self.variables!r}, {self.values!r})"
+
+    def strides(self, variables):
+        """
+        Returns, for each of `variables`, how far apart its values are in
+        this factor's table (0 for variables not in this factor).
+        """
+        strides = dict()
+        stride = 1
+        for variable in reversed(self.variables):
+            strides[variable] = stride
+            stride *= len(GENES)
+        return [strides.get(variable, 0) for variable in variables]
+
+    def __mul__(self, other):
+        variables = self.variables + tuple(
+            variable for variable in other.variables
+            if variable not in self.variables
+        )
+        mine = self.strides(variables)
+        theirs = other.strides(variables)
+        values = []
+        for assignment in itertools.product(GENES, repeat=len(variables)):
+            i = sum(g * s for g, s in zip(assignment, mine))
+            j = sum(g * s for g, s in zip(assignment, theirs))
+            values.append(self.values[i] * other.values[j])
+        return Factor(variables, values)
+
+    def sum_out(self, keep):
+        """
+        Returns the factor over the variables in `keep`, summing over
+        every other variable.
+        """
+        keep = tuple(variable for variable in self.variables
+                     if variable in keep)
+        strides = Factor(keep, ()).strides(self.variables)
+        values = [0] * len(GENES) ** len(keep)
+        assignments = itertools.product(GENES, repeat=len(self.variables))
+        for assignment, value in zip(assignments, self.values):
+            values[sum(g * s for g, s in zip(assignment, strides))] += value
+        return Factor(keep, values)
+
+    def normalized(self):
+        """
+        Returns this factor scaled to sum to 1, so long chains of messages
+        do not underflow.
+        """
+        total = sum(self.values)
+        if total == 0:
+            raise ValueError("evidence has zero probability")
+        return Factor(self.variables, [value / total for value in self.values])
+
+
+def product(factors):
+    """
+    Returns the product of `factors`, or a constant factor of 1 if there
+    are none.
+    """
+    result = Factor((), [1])
+    for factor in factors:
+        result = result * factor
+    return result
+
+
+def inheritance(gene, mother, father, probs=PROBS):
+    """
+    Returns the probability that a child has `gene` copies of the gene,
+    given the number of copies their mother and father have.
+    """
+    passes = {
+        0: probs["mutation"],
+        1: 0.5,
+        2: 1 - probs["mutation"]
+    }
+    from_mother = passes[mother]
+    from_father = passes[father]
+    if gene == 0:
+        return (1 - from_mother) * (1 - from_father)
+    if gene == 1:
+        return (from_mother * (1 - from_father)
+                + (1 - from_mother) * from_father)
+    return from_mother * from_father
+
+
+def person_factor(people, person, probs=PROBS):
+    """
+    Returns the factor for one person's gene: the probability of their
+    gene count given their parents', times the probability of their
+    trait if it is known.
+    """
+    trait = people[person]["trait"]
+
+    def evidence(gene):
+        if trait is None:
+            return 1
+        return probs["trait"][gene][trait]
+
+    mother = people[person]["mother"]
+    father = people[person]["father"]
+    if mother is None or father is None:
+        return Factor((person,), [
+            probs["gene"][gene] * evidence(gene) for gene in GENES
+        ])
+
+    if mother == father:
+        raise ValueError(f"{person} has the same mother and father")
+
+    # Parents come first, so the child's value varies fastest
+    values = [
+        inheritance(gene, m, f, probs) * evidence(gene)
+        for m, f, gene in itertools.product(GENES, repeat=3)
+    ]
+    return Factor((mother, father, person), values)
+
+
+def min_fill_order(scopes):
+    """
+    Returns an order in which to eliminate the variables of factors with
+    the given `scopes`, choosing each time the variable whose elimination
+    connects the fewest pairs of its neighbors that were not already
+    connected, breaking ties by fewest neighbors.
+    """
+    neighbors = dict()
+    for scope in scopes:
+        for variable in scope:
+            neighbors.setdefault(variable, set()).update(scope)
+    for variable in neighbors:
+        neighbors[variable].discard(variable)
+
+    def fill(variable):
+        around = list(neighbors[variable])
+        return sum(
+            1
+            for i, a in enumerate(around)
+            for b in around[i + 1:]
+            if b not in neighbors[a]
+        )
+
+    def score(variable):
+        return (fill(variable), len(neighbors[variable]), str(variable))
+
+    # Scores only change around an eliminated variable, so scores are kept
+    # in a heap and stale entries skipped when popped
+    scores = {variable: score(variable) for variable in neighbors}
+    heap = [(s, variable) for variable, s in scores.items()]
+    heapq.heapify(heap)
+
+    order = []
+    while heap:
+        s, variable = heapq.heappop(heap)
+        if variable not in neighbors or scores[variable] != s:
+            continue
+        around = neighbors.pop(variable)
+        for a in around:
+            neighbors[a].discard(variable)
+            neighbors[a] |= around - {a}
+        order.append(variable)
+
+        changed = set(around)
+        for a in around:
+            changed |= neighbors[a]
+        for c in changed:
+            scores[c] = score(c)
+            heapq.heappush(heap, (scores[c], c))
+    return order
+
+
+class EliminationTree():
+    """
+    Clusters formed by eliminating variables one at a time. Eliminating a
+    variable multiplies every factor mentioning it into one cluster and
+    sums the variable out, leaving a message for the cluster that later
+    uses it: its parent. Passing messages back down from the roots then
+    gives every cluster the marginal over its variables.
+
+    Factors can be replaced after calibrating. Messages up from the
+    replaced factor's cluster are recomputed at once, and messages down
+    are marked stale and recomputed when a marginal needs them.
+    """
+
+    def __init__(self, factors, order=None):
+        factors = list(factors)
+        if order is None:
+            order = min_fill_order(factor.variables for factor in factors)
+        self.order = list(order)
+        self.cluster = {variable: n for n, variable in enumerate(self.order)}
+
+        # Each cluster's own factors, the clusters whose messages it takes,
+        # the cluster it sends its message to, and the messages themselves
+        self.factors = [[] for _ in self.order]
+        self.children = [[] for _ in self.order]
+        self.parent = [None] * len(self.order)
+        self.up = [None] * len(self.order)
+        self.down = [None] * len(self.order)
+
+        # Logs of the totals each message was divided by to normalize it
+        self.log_scales = [0] * len(self.order)
+
+        # Assign each factor to the first of its variables to be
+        # eliminated, and each message to the first of its variables after
+        # the one it came from
+        for factor in factors:
+            first = min(self.cluster[variable] for variable in factor.variables)
+            self.factors[first].append(factor)
+        self.scopes = [set() for _ in self.order]
+        for n, variable in enumerate(self.order):
+            scope = {variable}
+            for factor in self.factors[n]:
+                scope.update(factor.variables)
+            for child in self.children[n]:
+                scope.update(self.scopes[child] - {self.order[child]})
+            self.scopes[n] = scope
+            rest = scope - {variable}
+            if rest:
+                parent = min(self.cluster[v] for v in rest)
+                self.parent[n] = parent
+                self.children[parent].append(n)
+
+        # The root of each cluster's tree, and the clusters in each tree.
+        # Parents are eliminated after their children, so come later
+        self.root = list(range(len(self.order)))
+        self.members = dict()
+        for n in reversed(range(len(self.order))):
+            if self.parent[n] is not None:
+                self.root[n] = self.root[self.parent[n]]
+            self.members.setdefault(self.root[n], []).append(n)
+
+        # Clusters whose message down from their parent is out of date
+        self.stale = set()
+
+    def message_up(self, n):
+        """Computes the message from cluster n to its parent."""
+        variable = self.order[n]
+        belief = product(self.factors[n] + [self.up[c]
+                                            for c in self.children[n]])
+        message = belief.sum_out(self.scopes[n] - {variable})
+        self.log_scales[n] = log(sum(message.values))
+        self.up[n] = message.normalized()
+
+    def message_down(self, n):
+        """Computes the message to cluster n from its parent."""
+        parent = self.parent[n]
+        incoming = self.factors[parent] + [
+            self.up[c] for c in self.children[parent] if c != n
+        ]
+        if self.down[parent] is not None:
+            incoming.append(self.down[parent])
+        self.down[n] = product(incoming).sum_out(self.up[n].variables)
+        self.down[n] = self.down[n].normalized()
+
+    def calibrate(self):
+        """
+        Passes messages up in elimination order, then back down.
+        """
+        for n in range(len(self.order)):
+            self.message_up(n)
+        for n in reversed(range(len(self.order))):
+            if self.parent[n] is not None:
+                self.message_down(n)
+        self.stale.clear()
+
+    def replace(self, old, new):
+        """
+        Replaces factor `old` with `new`, over the same variables, and
+        returns the variables whose marginals may have changed: those in
+        the same tree.
+        """
+        n = min(self.cluster[variable] for variable in old.variables)
+        factors = self.factors[n]
+        factors[next(i for i, f in enumerate(factors) if f is old)] = new
+
+        # Messages up from the cluster to the root include the factor.
+        # Every message down also does, except those to clusters on that
+        # path, which only come from outside their subtree
+        path = set()
+        while n is not None:
+            self.message_up(n)
+            path.add(n)
+            root = n
+            n = self.parent[n]
+        members = self.members[root]
+        self.stale.update(
+            i for i in members if i not in path and self.parent[i] is not None
+        )
+        return [self.order[i] for i in members]
+
+    def refresh(self, n):
+        """
+        Recomputes any stale messages down from the root to cluster n.
+        """
+        path = []
+        while n in self.stale:
+            path.append(n)
+            n = self.parent[n]
+        for i in reversed(path):
+            self.message_down(i)
+            self.stale.discard(i)
+
+    def log_evidence(self):
+        """
+        Returns the log of the probability of the observed traits, the
+        product of every total messages were divided by. Needs calibrate()
+        to have been run.
+        """
+        return sum(self.log_scales)
+
+    def marginal(self, variable):
+        """
+        Returns the distribution of `variable` as a dict mapping each gene
+        count to its probability. Needs calibrate() to have been run.
+        """
+        n = self.cluster[variable]
+        self.refresh(n)
+        incoming = self.factors[n] + [self.up[c] for c in self.children[n]]
+        if self.down[n] is not None:
+            incoming.append(self.down[n])
+        values = product(incoming).sum_out((variable,)).normalized().values
+        return dict(zip(GENES, values))
+
+
+class PosteriorQuery():
+    """
+    Gene and trait distributions for a pedigree, kept up to date as traits
+    are observed. The elimination tree and its messages are built once;
+    observing a trait replaces one person's factor, recomputes only the
+    messages that depend on it, and forgets only the distributions of the
+    people related to them.
+
+        query = PosteriorQuery(load_data("data/family0.csv"))
+        query.observe("Harry", True)
+        query.posterior("Harry")["gene"]
+    """
+
+    def __init__(self, people, probs=PROBS):
+        self.people = {name: dict(person) for name, person in people.items()}
+        self.probs = probs
+        self.factors = {
+            person: person_factor(self.people, person, probs)
+            for person in self.people
+        }
+        self.tree = EliminationTree(self.factors.values())
+        self.tree.calibrate()
+
+        # Distributions already computed, by person
+        self.cache = dict()
+
+    def observe(self, person, trait):
+        """
+        Records whether `person` has the trait: True, False, or None if
+        it is not known.
+        """
+        if self.people[person]["trait"] == trait:
+            return
+        self.people[person]["trait"] = trait
+        factor = person_factor(self.people, person, self.probs)
+        for relative in self.tree.replace(self.factors[person], factor):
+            self.cache.pop(relative, None)
+        self.factors[person] = factor
+
+    def posterior(self, person):
+        """
+        Returns the gene and trait distributions of `person`, in the same
+        form as heredity.main computes.
+        """
+        if person in self.cache:
+            return self.cache[person]
+        gene = self.tree.marginal(person)
+        trait = self.people[person]["trait"]
+        if trait is None:
+            has_trait = sum(gene[g] * self.probs["trait"][g][True]
+                            for g in GENES)
+        else:
+            has_trait = 1 if trait else 0
+        self.cache[person] = {
+            "gene": {g: gene[g] for g in reversed(GENES)},
+            "trait": {True: has_trait, False: 1 - has_trait}
+        }
+        return self.cache[person]
+
+    def posteriors(self):
+        """
+        Returns the distributions of everyone, as posterior does.
+        """
+        return {person: self.posterior(person) for person in self.people}
+
+
+def posteriors(people, probs=PROBS):
+    """
+    Returns each person's gene and trait distributions given the observed
+    traits in `people`, in the same form as heredity.main computes.
+    """
+    return PosteriorQuery(people, probs).posteriors()
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python elimination.py data.csv")
+    people = load_data(sys.argv[1])
+    probabilities = posteriors(people)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import csv
 import itertools
+import math
 import sys
 
 PROBS = {
@@ -44,46 +45,30 @@ def main():
         sys.exit("Usage: python heredity.py data.csv")
     people = load_data(sys.argv[1])
 
-    # Keep track of gene and trait probabilities for each person
-    probabilities = {
+    # Keep track of the logs of gene and trait probabilities for each
+    # person, so that large families do not underflow
+    log_probabilities = {
         person: {
             "gene": {
-                2: 0,
-                1: 0,
-                0: 0
+                2: -math.inf,
+                1: -math.inf,
+                0: -math.inf
             },
             "trait": {
-                True: 0,
-                False: 0
+                True: -math.inf,
+                False: -math.inf
             }
         }
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-
-    for have_trait in powerset(names):
-
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
-
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
-
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+    # People in different families share no probabilities, so each
+    # family is enumerated on its own
+    for family in families(people):
+        enumerate_family(people, family, log_probabilities)
 
     # Ensure probabilities sum to 1
-    normalize(probabilities)
+    probabilities = normalize_log(log_probabilities)
 
     # Print results
     for person in people:
@@ -119,14 +104,76 @@ def load_data(filename):
 
 def powerset(s):
     """
-    Return a list of all possible subsets of set s.
+    Yield all possible subsets of set s, one at a time.
     """
     s = list(s)
-    return [
-        set(s) for s in itertools.chain.from_iterable(
-            itertools.combinations(s, r) for r in range(len(s) + 1)
-        )
-    ]
+    for subset in itertools.chain.from_iterable(
+        itertools.combinations(s, r) for r in range(len(s) + 1)
+    ):
+        yield set(subset)
+
+
+def families(people):
+    """
+    Yield each set of people connected to each other through parents and
+    children. People in different sets are independent of each other.
+    """
+    relatives = {person: set() for person in people}
+    for person in people:
+        for parent in (people[person]["mother"], people[person]["father"]):
+            if parent is not None:
+                relatives[person].add(parent)
+                relatives[parent].add(person)
+
+    seen = set()
+    for person in people:
+        if person in seen:
+            continue
+        family = {person}
+        stack = [person]
+        while stack:
+            for relative in relatives[stack.pop()]:
+                if relative not in family:
+                    family.add(relative)
+                    stack.append(relative)
+        seen |= family
+        yield family
+
+
+def enumerate_family(people, family, log_probabilities):
+    """
+    Add to `log_probabilities` the log of the joint probability of every
+    assignment of genes and traits to the people in `family` that agrees
+    with the traits already known.
+
+    Only genes are enumerated. Given their genes, the traits of people
+    whose trait is unknown depend on nothing else, so they are summed out
+    one person at a time instead of enumerating every set of such people
+    who might have the trait.
+    """
+    members = {person: people[person] for person in family}
+
+    for one_gene in powerset(family):
+        for two_genes in powerset(family - one_gene):
+            log_p = log_evidence_probability(members, one_gene, two_genes)
+
+            for person in family:
+                numGenes = getNumGenes(person, one_gene, two_genes)
+                gene = log_probabilities[person]["gene"]
+                gene[numGenes] = log_add(gene[numGenes], log_p)
+
+                # A known trait takes the whole probability, and an unknown
+                # one splits it by the chance of the trait given the genes
+                trait = log_probabilities[person]["trait"]
+                known = people[person]["trait"]
+                for hasTrait in (True, False):
+                    if known is None:
+                        traitProb = PROBS["trait"][numGenes][hasTrait]
+                        trait[hasTrait] = log_add(
+                            trait[hasTrait], log_p + log(traitProb)
+                        )
+                    elif known == hasTrait:
+                        trait[hasTrait] = log_add(trait[hasTrait], log_p)
 
 
 def joint_probability(people, one_gene, two_genes, have_trait):
@@ -152,7 +199,7 @@ def joint_probability(people, one_gene, two_genes, have_trait):
             else:
                 resultProbs.append(parentsProb * PROBS["trait"][numGenes][False])
         else:
-            resultProbs.append(getNoParents(numGenes, people[person]["trait"]))
+            resultProbs.append(getNoParents(numGenes, person in have_trait))
 
     result = 1
     for prob in resultProbs:
@@ -161,6 +208,26 @@ def joint_probability(people, one_gene, two_genes, have_trait):
     return result
 
 
+def log_evidence_probability(people, one_gene, two_genes):
+    """
+    Compute and return the log of the joint probability of the genes in
+    `one_gene` and `two_genes` and of the traits already known, leaving
+    out the traits of people whose trait is unknown.
+    """
+    result = 0
+    for person in people:
+        numGenes = getNumGenes(person, one_gene, two_genes)
+        if people[person]["father"]:
+            geneProb = getParents(people, person, numGenes, one_gene, two_genes)
+        else:
+            geneProb = PROBS["gene"][numGenes]
+        result += log(geneProb)
+        if people[person]["trait"] is not None:
+            traitProb = PROBS["trait"][numGenes][people[person]["trait"]]
+            result += log(traitProb)
+    return result
+
+
 def getNumGenes(person, one_gene, two_genes):
     if person in two_genes:
         return 2
@@ -198,7 +265,7 @@ def getParents(people, person, numGenes, one_gene, two_genes):
 
 
 def getNoParents(numGenes, trait):
-    return round(PROBS["gene"][numGenes] * PROBS["trait"][numGenes][trait], 6)
+    return PROBS["gene"][numGenes] * PROBS["trait"][numGenes][trait]
 
 
 def update(probabilities, one_gene, two_genes, have_trait, p):
@@ -233,14 +300,72 @@ def normalize(probabilities):
             sumOfAllGene += probabilities[person]["gene"][n]
 
         for n in probabilities[person]["gene"]:
-            probabilities[person]["gene"][n] = round(probabilities[person]["gene"][n] / sumOfAllGene, 10)
+            probabilities[person]["gene"][n] = probabilities[person]["gene"][n] / sumOfAllGene
 
         sumOfAllTrait = 0
         for n in probabilities[person]["trait"]:
             sumOfAllTrait += probabilities[person]["trait"][n]
         
         for n in probabilities[person]["trait"]:
-            probabilities[person]["trait"][n] = round(probabilities[person]["trait"][n] / sumOfAllTrait, 10)
+            probabilities[person]["trait"][n] = probabilities[person]["trait"][n] / sumOfAllTrait
+
+
+def normalize_log(log_probabilities):
+    """
+    Return the normalized probability distributions whose unnormalized
+    logs are in `log_probabilities`.
+    """
+    return {
+        person: {
+            field: dict(zip(
+                log_probabilities[person][field],
+                log_normalize(log_probabilities[person][field].values())
+            ))
+            for field in log_probabilities[person]
+        }
+        for person in log_probabilities
+    }
+
+
+def log(p):
+    """
+    Return the natural log of probability p, or -inf if p is 0.
+    """
+    return math.log(p) if p > 0 else -math.inf
+
+
+def log_add(a, b):
+    """
+    Return log(exp(a) + exp(b)) without leaving log space.
+    """
+    if a < b:
+        a, b = b, a
+    if b == -math.inf:
+        return a
+    return a + math.log1p(math.exp(b - a))
+
+
+def logsumexp(values):
+    """
+    Return log(sum(exp(v) for v in values)), shifting by the largest value
+    so that nothing overflows or underflows.
+    """
+    values = list(values)
+    top = max(values, default=-math.inf)
+    if top == -math.inf:
+        return top
+    return top + math.log(sum(math.exp(v - top) for v in values))
+
+
+def log_normalize(values):
+    """
+    Return the probabilities proportional to exp(v) for each of `values`.
+    """
+    values = list(values)
+    total = logsumexp(values)
+    if total == -math.inf:
+        raise ValueError("every probability is zero")
+    return [math.exp(v - total) for v in values]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,463 @@
+"""
+Approximate inference for heredity by sampling, for pedigrees too large
+for exact methods.
+
+Two samplers are provided. Gibbs sampling repeatedly redraws each
+person's gene count given everyone else's. Likelihood weighting draws
+every gene count from its parents' and weights each draw by how likely
+the observed traits are under it. Both run several independent chains in
+parallel processes, in rounds, until a time budget runs out or the
+estimates are precise enough, and report how well the chains agree.
+
+Usage: python sampling.py data.csv [gibbs|weighting] [seconds]
+"""
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from elimination import GENES, inheritance
+from heredity import PROBS, load_data, log, log_normalize
+
+
+class Model():
+    """
+    The heredity Bayesian network, with people numbered so that parents
+    come before their children.
+    """
+
+    def __init__(self, people, probs=PROBS):
+        self.probs = probs
+
+        # Order people so that parents come before children
+        self.names = []
+        placed = set()
+
+        def place(person):
+            stack = [person]
+            while stack:
+                current = stack[-1]
+                parents = [
+                    parent for parent in (people[current]["mother"],
+                                          people[current]["father"])
+                    if parent is not None and parent not in placed
+                ]
+                if parents:
+                    stack.extend(parents)
+                    continue
+                stack.pop()
+                if current not in placed:
+                    placed.add(current)
+                    self.names.append(current)
+
+        for person in people:
+            place(person)
+        index = {name: i for i, name in enumerate(self.names)}
+
+        # Each person's parents (None for founders), children, observed
+        # trait, and the probability of that trait for each gene count
+        self.parents = []
+        self.children = [[] for _ in self.names]
+        self.traits = []
+        self.evidence = []
+        for i, name in enumerate(self.names):
+            mother = people[name]["mother"]
+            father = people[name]["father"]
+            if mother is None or father is None:
+                self.parents.append(None)
+            else:
+                self.parents.append((index[mother], index[father]))
+                self.children[index[mother]].append(i)
+                self.children[index[father]].append(i)
+            trait = people[name]["trait"]
+            self.traits.append(trait)
+            self.evidence.append([
+                1 if trait is None else probs["trait"][g][trait]
+                for g in GENES
+            ])
+
+        self.prior = [probs["gene"][g] for g in GENES]
+        self.inheritance = [
+            [[inheritance(g, m, f, probs) for g in GENES] for f in GENES]
+            for m in GENES
+        ]
+
+        # Logs of the same tables, for products over many people
+        self.log_prior = [log(p) for p in self.prior]
+        self.log_inheritance = [
+            [[log(p) for p in row] for row in table]
+            for table in self.inheritance
+        ]
+        self.log_evidence = [[log(p) for p in row] for row in self.evidence]
+
+    def log_gene_weights(self, i, genes):
+        """
+        Returns the logs of the probabilities gene_weights returns.
+        """
+        if self.parents[i] is None:
+            return self.log_prior
+        mother, father = self.parents[i]
+        return self.log_inheritance[genes[mother]][genes[father]]
+
+    def gene_weights(self, i, genes):
+        """
+        Returns the probability of each gene count for person i, given
+        their parents' gene counts in `genes`.
+        """
+        if self.parents[i] is None:
+            return self.prior
+        mother, father = self.parents[i]
+        return self.inheritance[genes[mother]][genes[father]]
+
+    def sample(self, rng):
+        """
+        Draws gene counts for everyone from the model, ignoring evidence,
+        and returns them with the log of the probability of the evidence
+        given them.
+        """
+        genes = [0] * len(self.names)
+        log_weight = 0
+        for i in range(len(self.names)):
+            genes[i] = rng.choices(GENES, self.gene_weights(i, genes))[0]
+            log_weight += self.log_evidence[i][genes[i]]
+        return genes, log_weight
+
+    def posteriors(self, genes):
+        """
+        Returns the gene and trait distributions for each person, in the
+        same form as heredity.main computes, from a list of each person's
+        probability of having 0, 1 or 2 copies of the gene.
+        """
+        probabilities = dict()
+        for i, name in enumerate(self.names):
+            total = sum(genes[i])
+            gene = [p / total for p in genes[i]]
+            trait = self.traits[i]
+            if trait is None:
+                has_trait = sum(gene[g] * self.probs["trait"][g][True]
+                                for g in GENES)
+            else:
+                has_trait = 1 if trait else 0
+            probabilities[name] = {
+                "gene": {g: gene[g] for g in reversed(GENES)},
+                "trait": {True: has_trait, False: 1 - has_trait}
+            }
+        return probabilities
+
+
+class GibbsChain():
+    """
+    Gibbs sampler over everyone's gene counts. After each sweep, every
+    person's conditional distribution is added to running totals, which
+    estimates the posterior with less noise than counting draws.
+    """
+
+    def __init__(self, model, seed, burn_in=100):
+        self.model = model
+        self.rng = random.Random(seed)
+        self.genes, _ = model.sample(self.rng)
+        self.burn_in = burn_in
+        people = len(model.names)
+        self.sweeps = 0
+        self.sums = [[0] * len(GENES) for _ in range(people)]
+        self.squares = [[0] * len(GENES) for _ in range(people)]
+
+    def conditional(self, i):
+        """
+        Returns the distribution of person i's gene count given everyone
+        else's current gene counts. The product over their children is
+        taken in log space, since people may have many children.
+        """
+        model = self.model
+        genes = self.genes
+        weights = [
+            p + e for p, e in zip(model.log_gene_weights(i, genes),
+                                  model.log_evidence[i])
+        ]
+        for child in model.children[i]:
+            mother, father = model.parents[child]
+            for g in GENES:
+                m = g if mother == i else genes[mother]
+                f = g if father == i else genes[father]
+                weights[g] += model.log_inheritance[m][f][genes[child]]
+        return log_normalize(weights)
+
+    def run(self, sweeps):
+        """Runs `sweeps` sweeps over everyone, after any burn-in left."""
+        while self.burn_in > 0:
+            self.sweep(record=False)
+            self.burn_in -= 1
+        for _ in range(sweeps):
+            self.sweep(record=True)
+        return self
+
+    def sweep(self, record):
+        """Redraws everyone's gene count once, in order."""
+        for i in range(len(self.genes)):
+            distribution = self.conditional(i)
+            self.genes[i] = self.rng.choices(GENES, distribution)[0]
+            if record:
+                sums = self.sums[i]
+                squares = self.squares[i]
+                for g in GENES:
+                    sums[g] += distribution[g]
+                    squares[g] += distribution[g] ** 2
+        if record:
+            self.sweeps += 1
+
+
+class WeightingChain():
+    """
+    Likelihood weighting sampler. Weights are kept relative to the largest
+    log weight seen, so they do not underflow in large pedigrees.
+    """
+
+    def __init__(self, model, seed):
+        self.model = model
+        self.rng = random.Random(seed)
+        self.scale = -math.inf
+        self.samples = 0
+        self.weight = 0
+        self.squared_weight = 0
+        self.sums = [[0] * len(GENES) for _ in model.names]
+
+    def run(self, samples):
+        """Draws `samples` more weighted samples."""
+        for _ in range(samples):
+            genes, log_weight = self.model.sample(self.rng)
+            if log_weight == -math.inf:
+                continue
+            if log_weight > self.scale:
+                self.rescale(log_weight)
+            weight = math.exp(log_weight - self.scale)
+            self.weight += weight
+            self.squared_weight += weight ** 2
+            for i, g in enumerate(genes):
+                self.sums[i][g] += weight
+        self.samples += samples
+        return self
+
+    def rescale(self, scale):
+        """Expresses the running totals relative to a new scale."""
+        factor = math.exp(self.scale - scale)
+        self.weight *= factor
+        self.squared_weight *= factor ** 2
+        for sums in self.sums:
+            for g in GENES:
+                sums[g] *= factor
+        self.scale = scale
+
+
+def _advance(job):
+    """Runs a chain for some steps in a worker process."""
+    chain, steps = job
+    return chain.run(steps)
+
+
+def gibbs_diagnostics(chains):
+    """
+    Returns the combined estimate of each person's gene distribution and
+    diagnostics for a list of Gibbs chains: the largest potential scale
+    reduction factor (R-hat) and the largest standard error of any
+    estimate across chains.
+    """
+    n = min(chain.sweeps for chain in chains)
+    total = sum(chain.sweeps for chain in chains)
+    people = len(chains[0].sums)
+    estimate = [
+        [sum(chain.sums[i][g] for chain in chains) / total for g in GENES]
+        for i in range(people)
+    ]
+
+    rhat = 1
+    error = math.inf
+    if len(chains) > 1 and n > 1:
+        error = 0
+        for i in range(people):
+            for g in GENES:
+                means = [chain.sums[i][g] / chain.sweeps for chain in chains]
+                variances = [
+                    max(chain.squares[i][g] / chain.sweeps - mean ** 2, 0)
+                    * chain.sweeps / (chain.sweeps - 1)
+                    for chain, mean in zip(chains, means)
+                ]
+                mean = sum(means) / len(means)
+                between = (sum((m - mean) ** 2 for m in means)
+                           / (len(means) - 1))
+                within = sum(variances) / len(variances)
+                error = max(error, math.sqrt(between / len(means)))
+                if within > 0:
+                    pooled = (n - 1) / n * within + between
+                    rhat = max(rhat, math.sqrt(pooled / within))
+    return estimate, {"rhat": rhat, "standard_error": error,
+                      "sweeps": total}
+
+
+def weighting_diagnostics(chains):
+    """
+    Returns the combined estimate of each person's gene distribution and
+    diagnostics for a list of likelihood weighting chains: the effective
+    sample size and the standard error of an estimate of 0.5 with that many
+    samples, the largest any estimate could have. Neither can be trusted
+    when only a handful of samples carry most of the weight.
+    """
+    scale = max(chain.scale for chain in chains)
+    factors = [math.exp(chain.scale - scale) if chain.weight else 0
+               for chain in chains]
+    weight = sum(c.weight * f for c, f in zip(chains, factors))
+    squared = sum(c.squared_weight * f ** 2 for c, f in zip(chains, factors))
+    samples = sum(chain.samples for chain in chains)
+    people = len(chains[0].sums)
+    if weight == 0:
+        return None, {"effective_samples": 0, "standard_error": math.inf,
+                      "samples": samples}
+
+    estimate = [
+        [sum(c.sums[i][g] * f for c, f in zip(chains, factors)) / weight
+         for g in GENES]
+        for i in range(people)
+    ]
+    # With few effective samples the estimates themselves are unreliable,
+    # so the error uses the largest possible variance instead
+    effective = weight ** 2 / squared
+    error = 0.5 / math.sqrt(effective)
+    return estimate, {"effective_samples": effective,
+                      "standard_error": error, "samples": samples}
+
+
+def run_chains(chains, diagnose, done, seconds=None, steps=10,
+               processes=None):
+    """
+    Advances `chains` in rounds across a pool of processes until `done`
+    accepts the diagnostics, or `seconds` have passed. Each round runs
+    `steps` steps of every chain, doubling while rounds are quick.
+
+    Returns the final estimate and diagnostics.
+    """
+    processes = min(processes or os.cpu_count() or 1, len(chains))
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    try:
+        while True:
+            round_start = time.perf_counter()
+            jobs = [(chain, steps) for chain in chains]
+            chains = pool.map(_advance, jobs) if pool else list(
+                map(_advance, jobs)
+            )
+            estimate, diagnostics = diagnose(chains)
+
+            elapsed = time.perf_counter() - start
+            diagnostics["seconds"] = elapsed
+            if done(diagnostics):
+                diagnostics["stopped"] = "precision"
+                return estimate, diagnostics
+            if seconds is not None and elapsed >= seconds:
+                diagnostics["stopped"] = "time"
+                return estimate, diagnostics
+
+            # Keep rounds long enough that passing chains around is cheap,
+            # and short enough to stop near the time budget
+            took = time.perf_counter() - round_start
+            if took < 0.5 and (seconds is None
+                               or elapsed + 2 * took < seconds):
+                steps *= 2
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def _check_budget(seconds, precision):
+    if seconds is None and precision is None:
+        raise ValueError("need a time budget, a precision, or both")
+
+
+def gibbs(people, chains=4, seconds=10, precision=None, max_rhat=1.05,
+          burn_in=100, seed=0, processes=None, probs=PROBS):
+    """
+    Estimates each person's gene and trait distributions by Gibbs
+    sampling with `chains` chains, in the same form as heredity.main
+    computes.
+
+    Stops after `seconds` seconds, or once every estimate's standard error
+    across chains is at most `precision` and R-hat is at most `max_rhat`.
+    Both diagnostics need at least two chains, so a single chain must have
+    a time budget. Returns the distributions and a dict of diagnostics.
+    """
+    _check_budget(seconds, precision)
+    if seconds is None and chains < 2:
+        raise ValueError("precision needs at least two chains, "
+                         "or a time budget")
+    model = Model(people, probs)
+    chains = [GibbsChain(model, seed + k, burn_in) for k in range(chains)]
+
+    def done(diagnostics):
+        return (precision is not None
+                and diagnostics["standard_error"] <= precision
+                and diagnostics["rhat"] <= max_rhat)
+
+    estimate, diagnostics = run_chains(chains, gibbs_diagnostics, done,
+                                       seconds, processes=processes)
+    return model.posteriors(estimate), diagnostics
+
+
+def likelihood_weighting(people, chains=4, seconds=10, precision=None,
+                         seed=0, processes=None, probs=PROBS):
+    """
+    Estimates each person's gene and trait distributions by likelihood
+    weighting with `chains` chains, in the same form as heredity.main
+    computes.
+
+    Stops after `seconds` seconds, or once every estimate's standard error
+    is at most `precision`. Returns the distributions and a dict of
+    diagnostics.
+    """
+    _check_budget(seconds, precision)
+    model = Model(people, probs)
+    chains = [WeightingChain(model, seed + k) for k in range(chains)]
+
+    def done(diagnostics):
+        return (precision is not None
+                and diagnostics["standard_error"] <= precision)
+
+    estimate, diagnostics = run_chains(chains, weighting_diagnostics, done,
+                                       seconds, steps=100,
+                                       processes=processes)
+    if estimate is None:
+        raise ValueError("no sample had nonzero weight")
+    return model.posteriors(estimate), diagnostics
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in (2, 3, 4):
+        sys.exit("Usage: python sampling.py data.csv [gibbs|weighting] "
+                 "[seconds]")
+    people = load_data(sys.argv[1])
+    method = sys.argv[2] if len(sys.argv) > 2 else "gibbs"
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    if method == "gibbs":
+        probabilities, diagnostics = gibbs(people, seconds=seconds)
+    elif method == "weighting":
+        probabilities, diagnostics = likelihood_weighting(people,
+                                                          seconds=seconds)
+    else:
+        sys.exit(f"Unknown method {method!r}")
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+    for name, value in diagnostics.items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Enumeration for heredity with NumPy, computing the joint probabilities of
+many assignments at once.
+
+An assignment is a row of gene counts, one per person, and a row of
+traits (1 for having the trait, 0 for not). joint_probability and update
+take arrays of such rows, so every batch of assignments is handled by
+array operations rather than a Python loop per assignment. Probabilities
+are multiplied as sums of logs, so they do not underflow.
+
+Usage: python vectorized.py data.csv
+"""
+import sys
+
+import numpy as np
+
+from heredity import PROBS, load_data
+
+
+class Tables():
+    """
+    Logs of the conditional probability tables for each person, indexed by
+    gene count (0, 1 or 2) and trait (0 or 1).
+    """
+
+    def __init__(self, people, probs=PROBS):
+        self.names = list(people)
+        index = {name: i for i, name in enumerate(self.names)}
+
+        # P(gene) for people without parents, P(gene | mother, father)
+        # for everyone else, and P(trait | gene)
+        prior = np.array([probs["gene"][g] for g in range(3)])
+        passes = np.array([
+            probs["mutation"], 0.5, 1 - probs["mutation"]
+        ])
+        from_mother = passes[:, None]
+        from_father = passes[None, :]
+        inheritance = np.stack([
+            (1 - from_mother) * (1 - from_father),
+            from_mother * (1 - from_father) + (1 - from_mother) * from_father,
+            from_mother * from_father
+        ], axis=-1)
+        trait = np.array([
+            [probs["trait"][g][False], probs["trait"][g][True]]
+            for g in range(3)
+        ])
+        with np.errstate(divide="ignore"):
+            self.prior = np.log(prior)
+            self.inheritance = np.log(inheritance)
+            self.trait = np.log(trait)
+
+        # Columns of founders, and of children with their parents' columns
+        self.founders = np.array([
+            index[name] for name in self.names
+            if not people[name]["mother"] or not people[name]["father"]
+        ], dtype=np.intp)
+        children = [
+            name for name in self.names
+            if people[name]["mother"] and people[name]["father"]
+        ]
+        self.children = np.array([index[name] for name in children],
+                                 dtype=np.intp)
+        self.mothers = np.array([index[people[name]["mother"]]
+                                 for name in children], dtype=np.intp)
+        self.fathers = np.array([index[people[name]["father"]]
+                                 for name in children], dtype=np.intp)
+
+        # Columns whose trait is known, and the known traits
+        self.observed = np.array([
+            i for i, name in enumerate(self.names)
+            if people[name]["trait"] is not None
+        ], dtype=np.intp)
+        self.evidence = np.array([
+            int(people[self.names[i]]["trait"]) for i in self.observed
+        ], dtype=np.intp)
+        self.unobserved = np.array([
+            i for i, name in enumerate(self.names)
+            if people[name]["trait"] is None
+        ], dtype=np.intp)
+
+
+def log_joint_probability(tables, genes, traits):
+    """
+    Returns the log of the joint probability of each assignment, given
+    arrays of shape (assignments, people) of gene counts and of traits.
+    """
+    log_p = np.sum(tables.prior[genes[:, tables.founders]], axis=1)
+    log_p += np.sum(tables.inheritance[
+        genes[:, tables.mothers],
+        genes[:, tables.fathers],
+        genes[:, tables.children]
+    ], axis=1)
+    log_p += np.sum(tables.trait[genes, traits], axis=1)
+    return log_p
+
+
+def joint_probability(tables, genes, traits):
+    """
+    Returns the joint probability of each assignment, given arrays of
+    shape (assignments, people) of gene counts and of traits.
+    """
+    return np.exp(log_joint_probability(tables, genes, traits))
+
+
+def update(gene_totals, trait_totals, genes, traits, p):
+    """
+    Adds each assignment's joint probability `p` to the totals of the gene
+    count and trait it gives each person. `gene_totals` has shape
+    (people, 3) and `trait_totals` shape (people, 2).
+    """
+    people = np.arange(genes.shape[1])[None, :]
+    weights = np.broadcast_to(p[:, None], genes.shape)
+    np.add.at(gene_totals, (people, genes), weights)
+    np.add.at(trait_totals, (people, traits), weights)
+
+
+def assignments(tables, start, stop):
+    """
+    Returns the gene and trait arrays for assignments `start` to `stop`.
+    Assignment k gives person i gene count (k // 3 ** i) % 3, and the
+    people with unknown traits the bits of k // 3 ** people in turn.
+    People with known traits always get those traits.
+    """
+    people = len(tables.names)
+    k = np.arange(start, stop, dtype=np.int64)[:, None]
+    genes = (k // 3 ** np.arange(people, dtype=np.int64)) % 3
+    traits = np.empty((len(k), people), dtype=np.intp)
+    traits[:, tables.observed] = tables.evidence
+    bits = np.arange(len(tables.unobserved), dtype=np.int64)
+    traits[:, tables.unobserved] = (k // 3 ** people >> bits) & 1
+    return genes.astype(np.intp), traits
+
+
+def enumerate_posteriors(people, probs=PROBS, batch=1 << 16):
+    """
+    Returns each person's gene and trait distributions given the observed
+    traits in `people`, in the same form as heredity.main computes, by
+    summing the joint probability of every assignment consistent with the
+    observed traits, `batch` assignments at a time.
+
+    Totals are kept relative to the largest log joint probability seen,
+    so that they stay in range however small the probabilities get.
+    """
+    tables = Tables(people, probs)
+    count = len(tables.names)
+    total = 3 ** count * 2 ** len(tables.unobserved)
+    if total >= 2 ** 63:
+        raise ValueError(f"too many assignments to enumerate: {total}")
+
+    gene_totals = np.zeros((count, 3))
+    trait_totals = np.zeros((count, 2))
+    scale = -np.inf
+    for start in range(0, total, batch):
+        genes, traits = assignments(tables, start, min(start + batch, total))
+        log_p = log_joint_probability(tables, genes, traits)
+        top = log_p.max()
+        if top > scale:
+            if scale > -np.inf:
+                gene_totals *= np.exp(scale - top)
+                trait_totals *= np.exp(scale - top)
+            scale = top
+        if scale > -np.inf:
+            update(gene_totals, trait_totals, genes, traits,
+                   np.exp(log_p - scale))
+
+    if scale == -np.inf:
+        raise ValueError("evidence has zero probability")
+
+    gene_totals /= gene_totals.sum(axis=1, keepdims=True)
+    trait_totals /= trait_totals.sum(axis=1, keepdims=True)
+    return {
+        name: {
+            "gene": {g: float(gene_totals[i, g]) for g in (2, 1, 0)},
+            "trait": {True: float(trait_totals[i, 1]),
+                      False: float(trait_totals[i, 0])}
+        }
+        for i, name in enumerate(tables.names)
+    }
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python vectorized.py data.csv")
+    people = load_data(sys.argv[1])
+    probabilities = enumerate_posteriors(people)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+if __name__ == "__main__":
+    main()